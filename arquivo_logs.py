@@ -0,0 +1,173 @@
+"""
+Arquivamento do log de ações dos moderadores.
+
+O log_acoes_moderador guarda só os meses recentes (LOGS_RETENCAO_MESES); os
+registros mais antigos são movidos, um mês por transação, para tabelas mensais
+log_acoes_moderador_AAAAMM com as mesmas colunas. Cada mês arquivado fica
+registrado em arquivos_log_moderacao, e resumo_arquivos_log_moderacao guarda
+as contagens do mês por moderador, ação e tipo de item: as estatísticas somam
+esse resumo em vez de ler os arquivos, e as buscas por moderador ou por tipo
+só abrem as tabelas dos meses em que há registros do filtro.
+"""
+from datetime import datetime
+from sqlalchemy import MetaData, Table, select, insert, delete, func, literal
+from sqlalchemy.orm.attributes import set_committed_value
+from models import LogAcaoModerador, ArquivoLogModeracao, ResumoArquivoLogModeracao, Usuario
+from db import db
+
+# As tabelas mensais ficam fora do db.metadata: o create_all e as migrações não as conhecem
+_metadata_arquivo = MetaData()
+
+def _inicio_do_mes(data, meses_atras=0):
+    ano, mes = divmod(data.year * 12 + data.month - 1 - meses_atras, 12)
+    return datetime(ano, mes + 1, 1)
+
+def tabela_arquivo(periodo):
+    """
+    Tabela de arquivo de um mês, com as colunas do log (sem as chaves estrangeiras).
+
+    Args:
+        periodo (str): Mês no formato 'AAAA-MM'
+
+    Returns:
+        Table: Tabela log_acoes_moderador_AAAAMM
+    """
+    nome = f"{LogAcaoModerador.__tablename__}_{periodo.replace('-', '')}"
+    if nome in _metadata_arquivo.tables:
+        return _metadata_arquivo.tables[nome]
+
+    colunas = [
+        db.Column(coluna.name, coluna.type, primary_key=coluna.primary_key,
+                  nullable=coluna.nullable, autoincrement=False)
+        for coluna in LogAcaoModerador.__table__.columns
+    ]
+    return Table(
+        nome, _metadata_arquivo, *colunas,
+        db.Index(f'ix_{nome}_moderador_data_acao', 'moderador_id', 'data_acao'),
+        db.Index(f'ix_{nome}_tipo_item_data_acao', 'tipo_item', 'data_acao'),
+    )
+
+def _arquivar_mes(inicio, fim):
+    periodo = inicio.strftime('%Y-%m')
+    logs = LogAcaoModerador.__table__
+    arquivo = tabela_arquivo(periodo)
+    indice = ArquivoLogModeracao.__table__
+    resumo = ResumoArquivoLogModeracao.__table__
+    no_mes = (logs.c.data_acao >= inicio) & (logs.c.data_acao < fim)
+
+    # Cópia, remoção e atualização do índice na mesma transação: nada se perde
+    # nem aparece duplicado se o processo for interrompido
+    with db.engine.begin() as conexao:
+        arquivo.create(conexao, checkfirst=True)
+        nomes = [coluna.name for coluna in logs.columns]
+        movidos = conexao.execute(
+            insert(arquivo).from_select(nomes, select(*[logs.c[nome] for nome in nomes]).where(no_mes))
+        ).rowcount
+        conexao.execute(delete(logs).where(no_mes))
+
+        total, primeira, ultima = conexao.execute(
+            select(func.count(), func.min(arquivo.c.data_acao), func.max(arquivo.c.data_acao))
+        ).one()
+        conexao.execute(delete(resumo).where(resumo.c.periodo == periodo))
+        conexao.execute(delete(indice).where(indice.c.periodo == periodo))
+        conexao.execute(insert(indice).values(
+            periodo=periodo, tabela=arquivo.name, total=total,
+            inicio=primeira, fim=ultima, arquivado_em=datetime.utcnow()
+        ))
+        agrupamento = [arquivo.c.moderador_id, arquivo.c.acao, arquivo.c.categoria, arquivo.c.tipo_item]
+        conexao.execute(insert(resumo).from_select(
+            ['periodo', 'moderador_id', 'acao', 'categoria', 'tipo_item', 'total'],
+            select(literal(periodo), *agrupamento, func.count()).group_by(*agrupamento)
+        ))
+    return periodo, movidos
+
+def arquivar_logs(meses_retencao):
+    """
+    Move para as tabelas mensais os logs anteriores à janela de retenção.
+
+    Args:
+        meses_retencao (int): Meses completos mantidos no log, além do mês atual
+
+    Returns:
+        list: Lista de tuplas (periodo, registros movidos), do mês mais antigo ao mais novo
+    """
+    corte = _inicio_do_mes(datetime.utcnow(), max(int(meses_retencao), 1))
+    arquivados = []
+    while True:
+        mais_antigo = db.session.query(func.min(LogAcaoModerador.data_acao)).filter(
+            LogAcaoModerador.data_acao < corte
+        ).scalar()
+        db.session.commit()
+        if mais_antigo is None:
+            break
+        inicio = _inicio_do_mes(mais_antigo)
+        arquivados.append(_arquivar_mes(inicio, min(_inicio_do_mes(inicio, -1), corte)))
+    return arquivados
+
+def periodos_com_logs(**filtros):
+    """
+    Meses arquivados que têm registros com os filtros informados, do mais recente ao mais antigo.
+
+    Args:
+        **filtros: Igualdades sobre colunas do resumo (ex: moderador_id=1, tipo_item='campanha')
+
+    Returns:
+        list: Lista de períodos 'AAAA-MM'
+    """
+    consulta = db.session.query(ResumoArquivoLogModeracao.periodo).filter_by(**filtros)
+    return [periodo for periodo, in consulta.distinct().order_by(ResumoArquivoLogModeracao.periodo.desc())]
+
+def buscar_logs_arquivados(limite, **filtros):
+    """
+    Busca nos arquivos mensais os logs mais recentes que atendem aos filtros.
+
+    Os registros voltam como objetos LogAcaoModerador fora da sessão, com o
+    moderador já carregado, para serem exibidos como os do log atual.
+
+    Args:
+        limite (int): Número máximo de logs a retornar
+        **filtros: Igualdades sobre colunas do log (moderador_id, tipo_item)
+
+    Returns:
+        list: Lista de objetos LogAcaoModerador, do mais recente ao mais antigo
+    """
+    linhas = []
+    for periodo in periodos_com_logs(**filtros):
+        if len(linhas) >= limite:
+            break
+        arquivo = tabela_arquivo(periodo)
+        consulta = select(arquivo).filter_by(**filtros).order_by(
+            arquivo.c.data_acao.desc(), arquivo.c.id.desc()
+        ).limit(limite - len(linhas))
+        linhas.extend(db.session.execute(consulta).mappings())
+
+    moderadores = {}
+    ids = {linha['moderador_id'] for linha in linhas}
+    if ids:
+        moderadores = {u.id: u for u in Usuario.query.filter(Usuario.id.in_(ids))}
+
+    logs = []
+    for linha in linhas:
+        log = LogAcaoModerador(**linha)
+        # Sem disparar o backref: o log arquivado não pode entrar em Usuario.acoes_log nem na sessão
+        set_committed_value(log, 'moderador', moderadores.get(linha['moderador_id']))
+        logs.append(log)
+    return logs
+
+def contar_arquivados(*colunas, desde=None, **filtros):
+    """
+    Soma as contagens do resumo dos arquivos agrupando pelas colunas informadas.
+
+    Args:
+        *colunas (str): Colunas do resumo usadas no agrupamento (ex: 'acao', 'periodo')
+        desde (str, optional): Primeiro período considerado, 'AAAA-MM'
+        **filtros: Igualdades sobre colunas do resumo
+
+    Returns:
+        list: Lista de tuplas (*valores das colunas, total)
+    """
+    agrupamento = [getattr(ResumoArquivoLogModeracao, coluna) for coluna in colunas]
+    consulta = db.session.query(*agrupamento, func.sum(ResumoArquivoLogModeracao.total)).filter_by(**filtros)
+    if desde is not None:
+        consulta = consulta.filter(ResumoArquivoLogModeracao.periodo >= desde)
+    return [(*valores, int(total)) for *valores, total in consulta.group_by(*agrupamento).all()]
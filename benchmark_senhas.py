@@ -0,0 +1,162 @@
+"""
+Benchmark do hash de senhas, para escolher o custo e dimensionar os workers.
+
+Mede, com o algoritmo e o custo informados (padrão: os de senhas.PADRAO e das
+variáveis SENHA_*):
+  - latência de uma verificação de senha (mediana e p95) e CPU gasta por ela;
+  - vazão com várias threads verificando ao mesmo tempo (o hashlib libera o GIL);
+  - latência do POST /login completo, contra um banco SQLite temporário;
+e estima quantos núcleos são necessários para o pico de logins por segundo.
+
+Uso:
+    python benchmark_senhas.py
+    python benchmark_senhas.py --algoritmo pbkdf2_sha256 --iteracoes 600000 --pico 20
+    python benchmark_senhas.py --n 32768 --threads 8 --amostras 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from senhas import PADRAO, gerar_hash, verificar_senha
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def medir_verificacao(config, amostras):
+    """
+    Mede o tempo de parede e de CPU de verificar_senha.
+
+    Args:
+        config (dict): Configuração com as chaves de senhas.PADRAO
+        amostras (int): Quantidade de verificações
+
+    Returns:
+        tuple: (lista de tempos de parede em s, lista de tempos de CPU em s)
+    """
+    hash_senha = gerar_hash('senha-de-teste', config)
+    paredes, cpus = [], []
+    for _ in range(amostras):
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        if not verificar_senha('senha-de-teste', hash_senha):
+            raise RuntimeError('verificação falhou')
+        paredes.append(time.perf_counter() - inicio)
+        cpus.append(time.thread_time() - inicio_cpu)
+    return paredes, cpus
+
+def medir_vazao(config, threads, amostras):
+    """
+    Mede verificações por segundo com várias threads ao mesmo tempo.
+
+    Args:
+        config (dict): Configuração com as chaves de senhas.PADRAO
+        threads (int): Quantidade de threads
+        amostras (int): Verificações por thread
+
+    Returns:
+        float: Verificações por segundo
+    """
+    hash_senha = gerar_hash('senha-de-teste', config)
+
+    def trabalhar():
+        for _ in range(amostras):
+            verificar_senha('senha-de-teste', hash_senha)
+
+    inicio = time.perf_counter()
+    grupo = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for thread in grupo:
+        thread.start()
+    for thread in grupo:
+        thread.join()
+    return threads * amostras / (time.perf_counter() - inicio)
+
+def medir_login(config, amostras):
+    """
+    Mede o POST /login completo pelo cliente de teste do Flask, em um SQLite temporário.
+
+    Args:
+        config (dict): Configuração com as chaves de senhas.PADRAO
+        amostras (int): Quantidade de logins
+
+    Returns:
+        list: Tempos de parede em s
+    """
+    pasta = tempfile.mkdtemp(prefix='benchmark_senhas_')
+    # A aplicação lê DATABASE_URL e SENHA_* ao ser importada
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(pasta, 'benchmark.db')}"
+    os.environ['SQLITE_MANUTENCAO_INTERVALO'] = '0'
+    os.environ['EMAIL_INTERVALO'] = '0'
+    for chave, valor in config.items():
+        os.environ[chave] = str(valor)
+
+    from main import app
+    from db import db
+    from models import Usuario
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Usuario(nome='Benchmark', email='benchmark@exemplo.com',
+                               senha=gerar_hash('senha-de-teste', config), tipo='usuario'))
+        db.session.commit()
+
+    tempos = []
+    for _ in range(amostras):
+        cliente = app.test_client()
+        inicio = time.perf_counter()
+        resposta = cliente.post('/login', data={'EmailFormLogin': 'benchmark@exemplo.com',
+                                                'SenhaFormLogin': 'senha-de-teste'})
+        tempos.append(time.perf_counter() - inicio)
+        if resposta.status_code != 302:
+            raise RuntimeError(f'login falhou: {resposta.status_code}')
+    return tempos
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do hash de senhas')
+    parser.add_argument('--algoritmo', default=os.environ.get('SENHA_ALGORITMO', PADRAO['SENHA_ALGORITMO']))
+    parser.add_argument('--n', type=int, default=int(os.environ.get('SENHA_SCRYPT_N', PADRAO['SENHA_SCRYPT_N'])))
+    parser.add_argument('--r', type=int, default=int(os.environ.get('SENHA_SCRYPT_R', PADRAO['SENHA_SCRYPT_R'])))
+    parser.add_argument('--p', type=int, default=int(os.environ.get('SENHA_SCRYPT_P', PADRAO['SENHA_SCRYPT_P'])))
+    parser.add_argument('--iteracoes', type=int,
+                        default=int(os.environ.get('SENHA_PBKDF2_ITERACOES', PADRAO['SENHA_PBKDF2_ITERACOES'])))
+    parser.add_argument('--amostras', type=int, default=20, help='Verificações/logins medidos')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Threads no teste de vazão')
+    parser.add_argument('--pico', type=float, default=10.0, help='Pico esperado de logins por segundo')
+    parser.add_argument('--sem-login', action='store_true', help='Não mede o POST /login completo')
+    args = parser.parse_args()
+
+    config = {
+        'SENHA_ALGORITMO': args.algoritmo,
+        'SENHA_SCRYPT_N': args.n,
+        'SENHA_SCRYPT_R': args.r,
+        'SENHA_SCRYPT_P': args.p,
+        'SENHA_PBKDF2_ITERACOES': args.iteracoes,
+    }
+
+    print("\n" + "="*70)
+    print("BENCHMARK DO HASH DE SENHAS")
+    print("="*70)
+    print(f"Hash de exemplo: {gerar_hash('x', config).rsplit('$', 2)[0]}$...")
+
+    paredes, cpus = medir_verificacao(config, args.amostras)
+    cpu_media = statistics.mean(cpus)
+    print(f"\nVerificação: mediana {statistics.median(paredes) * 1000:.1f} ms, "
+          f"p95 {_percentil(paredes, 95) * 1000:.1f} ms, CPU {cpu_media * 1000:.1f} ms")
+
+    vazao = medir_vazao(config, args.threads, max(1, args.amostras // 2))
+    print(f"Vazão com {args.threads} threads: {vazao:.1f} verificações/s")
+
+    if not args.sem_login:
+        login = medir_login(config, args.amostras)
+        print(f"POST /login: mediana {statistics.median(login) * 1000:.1f} ms, "
+              f"p95 {_percentil(login, 95) * 1000:.1f} ms")
+
+    nucleos = args.pico * cpu_media
+    print(f"\nPico de {args.pico:g} logins/s ≈ {nucleos:.2f} núcleo(s) só com hash de senha "
+          f"({1 / cpu_media:.1f} logins/s por núcleo).")
+    if cpu_media < 0.05:
+        print("⚠️  Menos de 50 ms de CPU por verificação: considere aumentar o custo.")
+    print("="*70 + "\n")
+    sys.exit(0)
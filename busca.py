@@ -0,0 +1,233 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import select, table, column, literal_column, func, or_, text, false
+from models import Campanha
+from db import db
+
+# Marcadores de destaque devolvidos pelo SQLite; são trocados por <mark> depois do escape do HTML
+INICIO_DESTAQUE = '\x02'
+FIM_DESTAQUE = '\x03'
+
+DDL_INDICE_BUSCA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS campanhas_fts USING fts5(
+        titulo, descricao, localizacao,
+        content='campanhas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS campanhas_fts_ai AFTER INSERT ON campanhas BEGIN
+        INSERT INTO campanhas_fts(rowid, titulo, descricao, localizacao)
+        VALUES (new.id, new.titulo, new.descricao, new.localizacao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS campanhas_fts_ad AFTER DELETE ON campanhas BEGIN
+        INSERT INTO campanhas_fts(campanhas_fts, rowid, titulo, descricao, localizacao)
+        VALUES ('delete', old.id, old.titulo, old.descricao, old.localizacao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS campanhas_fts_au AFTER UPDATE OF titulo, descricao, localizacao ON campanhas BEGIN
+        INSERT INTO campanhas_fts(campanhas_fts, rowid, titulo, descricao, localizacao)
+        VALUES ('delete', old.id, old.titulo, old.descricao, old.localizacao);
+        INSERT INTO campanhas_fts(rowid, titulo, descricao, localizacao)
+        VALUES (new.id, new.titulo, new.descricao, new.localizacao);
+    END
+    """,
+]
+
+DDL_REMOVER_INDICE_BUSCA = [
+    "DROP TRIGGER IF EXISTS campanhas_fts_au",
+    "DROP TRIGGER IF EXISTS campanhas_fts_ad",
+    "DROP TRIGGER IF EXISTS campanhas_fts_ai",
+    "DROP TABLE IF EXISTS campanhas_fts",
+]
+
+# Pesos do bm25 por coluna: título, descrição, localização
+_PESOS_BM25 = (10.0, 1.0, 4.0)
+
+_campanhas_fts = table('campanhas_fts', column('rowid'))
+_indice_disponivel = None
+
+def criar_indice_busca():
+    """
+    Cria o índice FTS5 das campanhas e os gatilhos que o mantêm sincronizado.
+
+    Os gatilhos ficam no próprio banco, então qualquer INSERT, UPDATE ou DELETE
+    em campanhas atualiza o índice na mesma transação. Se o índice acabou de ser
+    criado, ele é populado com as campanhas existentes.
+
+    Returns:
+        bool: True se o índice está disponível, False se o banco não suporta FTS5
+    """
+    global _indice_disponivel
+
+    if db.engine.dialect.name != 'sqlite':
+        _indice_disponivel = False
+        return False
+
+    try:
+        existia = _tabela_fts_existe()
+        for ddl in DDL_INDICE_BUSCA:
+            db.session.execute(text(ddl))
+        db.session.commit()
+
+        if not existia:
+            reconstruir_indice_busca()
+
+        _indice_disponivel = True
+        return True
+    except Exception as e:
+        print(f"Erro ao criar índice de busca: {e}")
+        db.session.rollback()
+        _indice_disponivel = False
+        return False
+
+def reconstruir_indice_busca():
+    """
+    Reconstrói o índice de busca do zero a partir da tabela campanhas.
+
+    Returns:
+        int: Quantidade de campanhas indexadas
+    """
+    db.session.execute(text("INSERT INTO campanhas_fts(campanhas_fts) VALUES ('rebuild')"))
+    db.session.execute(text("INSERT INTO campanhas_fts(campanhas_fts) VALUES ('optimize')"))
+    db.session.commit()
+    return db.session.query(func.count(Campanha.id)).scalar()
+
+def indice_busca_disponivel():
+    """
+    Indica se o índice FTS5 existe no banco atual. O resultado é memorizado.
+
+    Returns:
+        bool: True se a busca textual indexada pode ser usada
+    """
+    global _indice_disponivel
+
+    if _indice_disponivel is None:
+        try:
+            _indice_disponivel = db.engine.dialect.name == 'sqlite' and _tabela_fts_existe()
+        except Exception as e:
+            print(f"Erro ao verificar índice de busca: {e}")
+            _indice_disponivel = False
+    return _indice_disponivel
+
+def _tabela_fts_existe():
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'campanhas_fts'"
+    )).first() is not None
+
+def termo_para_match(termo):
+    """
+    Converte o texto digitado pelo usuário em uma expressão MATCH segura.
+
+    Cada palavra vira um prefixo entre aspas ("palavra"*), de modo que operadores
+    do FTS5 digitados pelo usuário são tratados como texto comum.
+
+    Args:
+        termo (str): Texto da busca
+
+    Returns:
+        str: Expressão MATCH, ou None se não houver palavras pesquisáveis
+    """
+    palavras = re.findall(r'\w+', termo or '')
+    if not palavras:
+        return None
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def filtrar_busca(query, termo, status=None, relevancia=False):
+    """
+    Restringe uma consulta de Campanha ao resultado da busca textual.
+
+    Com o índice FTS5 disponível, o conjunto devolvido pelo MATCH conduz a
+    consulta: as campanhas são buscadas pela chave primária a partir dele, e o
+    filtro de status é aplicado sem índice (com o índice de status, o SQLite
+    percorreria todas as campanhas e faria um MATCH por linha). Só com
+    relevancia=True a consulta é unida a uma subconsulta com a coluna rank
+    (bm25, menor é melhor); o destaque do título e o trecho ficam para
+    destaques_busca, calculados só para a página exibida. Sem o índice, recai
+    em ILIKE sobre título, descrição e localização.
+
+    Args:
+        query: Consulta sobre Campanha
+        termo (str): Texto da busca
+        status (str, optional): Status exigido das campanhas
+        relevancia (bool): Se True, expõe o rank para ordenar pela relevância
+
+    Returns:
+        tuple: (consulta filtrada, subconsulta com campanha_id e rank, ou None)
+    """
+    if not indice_busca_disponivel():
+        if status is not None:
+            query = query.filter(Campanha.status == status)
+        like = f'%{termo}%'
+        return query.filter(or_(
+            Campanha.titulo.ilike(like),
+            Campanha.descricao.ilike(like),
+            Campanha.localizacao.ilike(like)
+        )), None
+
+    expressao = termo_para_match(termo)
+    if expressao is None:
+        # Termo sem palavras (só pontuação): nenhuma campanha, e não todas
+        return query.filter(false()), None
+
+    if status is not None:
+        # '+' unário do SQLite: a coluna continua comparada, mas o índice de status não é usado
+        query = query.filter(literal_column(f'+{Campanha.__tablename__}.status') == status)
+
+    alvo = literal_column('campanhas_fts')
+    if not relevancia:
+        correspondencias = select(_campanhas_fts.c.rowid).where(alvo.op('MATCH')(expressao))
+        return query.filter(Campanha.id.in_(correspondencias)), None
+
+    resultado = select(
+        _campanhas_fts.c.rowid.label('campanha_id'),
+        func.bm25(alvo, *_PESOS_BM25).label('rank'),
+    ).where(alvo.op('MATCH')(expressao)).subquery('busca')
+
+    return query.join(resultado, resultado.c.campanha_id == Campanha.id), resultado
+
+def destaques_busca(termo, campanha_ids):
+    """
+    Título com os termos destacados e trecho da descrição de algumas campanhas.
+
+    Args:
+        termo (str): Texto da busca
+        campanha_ids (list): IDs das campanhas da página exibida
+
+    Returns:
+        dict: {campanha_id: (titulo_destacado, trecho)}, já escapados (ver destacar);
+              vazio sem o índice FTS5
+    """
+    expressao = termo_para_match(termo)
+    if not campanha_ids or expressao is None or not indice_busca_disponivel():
+        return {}
+
+    alvo = literal_column('campanhas_fts')
+    linhas = db.session.execute(select(
+        _campanhas_fts.c.rowid,
+        func.highlight(alvo, 0, INICIO_DESTAQUE, FIM_DESTAQUE),
+        func.snippet(alvo, 1, INICIO_DESTAQUE, FIM_DESTAQUE, '…', 24),
+    ).where(alvo.op('MATCH')(expressao), _campanhas_fts.c.rowid.in_(campanha_ids)))
+    return {campanha_id: (destacar(titulo), destacar(trecho)) for campanha_id, titulo, trecho in linhas}
+
+def destacar(texto):
+    """
+    Escapa o texto devolvido pelo índice e converte os marcadores em <mark>.
+
+    Args:
+        texto (str): Texto com os marcadores INICIO_DESTAQUE/FIM_DESTAQUE
+
+    Returns:
+        Markup: HTML seguro para o template
+    """
+    if not texto:
+        return None
+    seguro = str(escape(texto))
+    seguro = seguro.replace(INICIO_DESTAQUE, '<mark class="search-highlight">')
+    seguro = seguro.replace(FIM_DESTAQUE, '</mark>')
+    return Markup(seguro)
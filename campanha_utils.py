@@ -0,0 +1,65 @@
+from models import Campanha, VoluntarioCampanha
+from db import db
+from sqlalchemy import func
+
+def expressao_num_voluntarios():
+    """
+    Monta a contagem de voluntários por campanha como uma subconsulta agrupada.
+
+    Returns:
+        tuple: (subconsulta com campanha_id/total, expressão coalesce(total, 0))
+    """
+    contagem = db.session.query(
+        VoluntarioCampanha.campanha_id,
+        func.count(VoluntarioCampanha.id).label('total')
+    ).group_by(VoluntarioCampanha.campanha_id).subquery()
+
+    return contagem, func.coalesce(contagem.c.total, 0)
+
+def com_num_voluntarios(query):
+    """
+    Junta a contagem de voluntários a uma consulta de Campanha.
+
+    A consulta resultante devolve tuplas (Campanha, num_voluntarios) em uma
+    única ida ao banco, sem carregar as linhas de VoluntarioCampanha.
+
+    Args:
+        query: Consulta sobre Campanha
+
+    Returns:
+        tuple: (consulta estendida, expressão num_voluntarios para uso em ORDER BY/WHERE)
+    """
+    contagem, num_voluntarios = expressao_num_voluntarios()
+    query = query.outerjoin(
+        contagem, contagem.c.campanha_id == Campanha.id
+    ).add_columns(num_voluntarios)
+    return query, num_voluntarios
+
+def anexar_num_voluntarios(linhas):
+    """
+    Converte tuplas (Campanha, num_voluntarios) em campanhas com o atributo num_voluntarios.
+
+    Args:
+        linhas (list): Resultado de uma consulta estendida por com_num_voluntarios
+
+    Returns:
+        list: Lista de objetos Campanha
+    """
+    campanhas = []
+    for campanha, num_voluntarios in linhas:
+        campanha.num_voluntarios = num_voluntarios
+        campanhas.append(campanha)
+    return campanhas
+
+def listar_com_num_voluntarios(query):
+    """
+    Executa uma consulta de Campanha já trazendo a contagem de voluntários.
+
+    Args:
+        query: Consulta sobre Campanha (filtros e ordenação já aplicados)
+
+    Returns:
+        list: Lista de objetos Campanha com o atributo num_voluntarios
+    """
+    query, _ = com_num_voluntarios(query)
+    return anexar_num_voluntarios(query.all())
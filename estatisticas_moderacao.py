@@ -0,0 +1,108 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from models import LogAcaoModerador
+from log_utils import obter_estatisticas_moderadores
+from arquivo_logs import contar_arquivados
+from db import db
+
+_cache_estatisticas = {'valor': None, 'expira_em': 0.0}
+_lock = threading.Lock()
+
+# Formatos do agrupamento por período: strftime do SQLite e to_char do PostgreSQL
+_PERIODOS = {
+    'dia': ('%Y-%m-%d', 'YYYY-MM-DD'),
+    'mes': ('%Y-%m', 'YYYY-MM'),
+}
+
+def _periodo(coluna, periodo):
+    formato_sqlite, formato_postgresql = _PERIODOS[periodo]
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.to_char(coluna, formato_postgresql)
+    return db.func.strftime(formato_sqlite, coluna)
+
+def _contar_por_periodo(periodo, desde):
+    balde = _periodo(LogAcaoModerador.data_acao, periodo).label('periodo')
+    linhas = db.session.query(
+        balde,
+        LogAcaoModerador.acao,
+        db.func.count(LogAcaoModerador.id)
+    ).filter(
+        LogAcaoModerador.data_acao >= desde
+    ).group_by(balde, LogAcaoModerador.acao).all()
+
+    # Os arquivos são mensais: só entram na série por mês
+    if periodo == 'mes':
+        linhas = linhas + contar_arquivados('periodo', 'acao', desde=desde.strftime('%Y-%m'))
+
+    periodos = {}
+    for chave, acao, total in linhas:
+        item = periodos.setdefault(chave, {'periodo': chave, 'total': 0, 'por_acao': {}})
+        item['total'] += total
+        item['por_acao'][acao] = item['por_acao'].get(acao, 0) + total
+    return [periodos[chave] for chave in sorted(periodos)]
+
+def calcular_estatisticas_moderacao(dias=30, meses=12):
+    """
+    Calcula as estatísticas das ações de moderação sobre todo o log, no banco,
+    incluindo o resumo dos meses arquivados.
+
+    Args:
+        dias (int): Quantidade de dias da série diária
+        meses (int): Quantidade de meses da série mensal (incluindo o atual)
+
+    Returns:
+        dict: total_acoes, por_acao ({acao: total}), denuncias_processadas,
+              por_dia e por_mes (listas de {periodo, total, por_acao}), moderadores
+              (ver log_utils.obter_estatisticas_moderadores) e atualizado_em
+    """
+    por_acao = dict(db.session.query(
+        LogAcaoModerador.acao,
+        db.func.count(LogAcaoModerador.id)
+    ).group_by(LogAcaoModerador.acao).all())
+    for acao, total in contar_arquivados('acao'):
+        por_acao[acao] = por_acao.get(acao, 0) + total
+
+    agora = datetime.utcnow()
+    inicio_dia = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    ano, mes = divmod(inicio_dia.year * 12 + inicio_dia.month - 1 - (meses - 1), 12)
+    inicio_mes = inicio_dia.replace(year=ano, month=mes + 1, day=1)
+
+    return {
+        'total_acoes': sum(por_acao.values()),
+        'por_acao': por_acao,
+        'denuncias_processadas': sum(total for acao, total in por_acao.items() if 'denuncia' in acao),
+        'por_dia': _contar_por_periodo('dia', inicio_dia - timedelta(days=dias - 1)),
+        'por_mes': _contar_por_periodo('mes', inicio_mes),
+        'moderadores': obter_estatisticas_moderadores(),
+        'atualizado_em': agora.isoformat(timespec='seconds'),
+    }
+
+def obter_estatisticas_moderacao():
+    """
+    Obtém as estatísticas de moderação, mantidas em cache por ESTATISTICAS_TTL segundos.
+
+    Returns:
+        dict: Mesmo formato de calcular_estatisticas_moderacao
+    """
+    agora = time.monotonic()
+    with _lock:
+        if _cache_estatisticas['valor'] is not None and agora < _cache_estatisticas['expira_em']:
+            return _cache_estatisticas['valor']
+
+    config = current_app.config
+    try:
+        estatisticas = calcular_estatisticas_moderacao(
+            dias=config.get('ESTATISTICAS_DIAS', 30),
+            meses=config.get('ESTATISTICAS_MESES', 12)
+        )
+    except Exception as e:
+        print(f"Erro ao calcular estatísticas de moderação: {e}")
+        return {'total_acoes': 0, 'por_acao': {}, 'denuncias_processadas': 0,
+                'por_dia': [], 'por_mes': [], 'moderadores': [], 'atualizado_em': None}
+
+    with _lock:
+        _cache_estatisticas['valor'] = estatisticas
+        _cache_estatisticas['expira_em'] = agora + config.get('ESTATISTICAS_TTL', 60)
+    return estatisticas
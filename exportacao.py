@@ -0,0 +1,158 @@
+"""
+Exportação em CSV ou JSONL dos logs de moderação, das solicitações e das doações.
+
+As linhas são lidas em lotes (yield_per, com cursor no servidor no PostgreSQL)
+e escritas por um gerador, então a resposta começa a sair com o cabeçalho e a
+memória usada não depende do tamanho da exportação.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select, exists
+from models import (LogAcaoModerador, SolicitacaoDoacao, SolicitacaoRecebimento, DoacaoCampanha,
+                    Delegacao, Campanha, ArquivoLogModeracao)
+from arquivo_logs import tabela_arquivo
+from db import db
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+def _delegadas_a(coluna_delegacao, coluna_id):
+    return lambda instituicao_id: exists().where(
+        coluna_delegacao == coluna_id, Delegacao.instituicao_id == instituicao_id
+    )
+
+# Para cada exportação: modelo, coluna de data e como filtrar por status e por
+# instituição (None quando o filtro não se aplica)
+EXPORTACOES = {
+    'logs': {
+        'modelo': LogAcaoModerador,
+        'data': 'data_acao',
+        'status': None,
+        'instituicao': None,
+    },
+    'doacoes': {
+        'modelo': SolicitacaoDoacao,
+        'data': 'data_criacao',
+        'status': 'status',
+        'instituicao': _delegadas_a(Delegacao.solicitacao_doacao_id, SolicitacaoDoacao.id),
+    },
+    'recebimentos': {
+        'modelo': SolicitacaoRecebimento,
+        'data': 'data_criacao',
+        'status': 'status',
+        'instituicao': _delegadas_a(Delegacao.solicitacao_recebimento_id, SolicitacaoRecebimento.id),
+    },
+    'doacoes_campanha': {
+        'modelo': DoacaoCampanha,
+        'data': 'data_doacao',
+        'status': None,
+        'instituicao': lambda instituicao_id: DoacaoCampanha.campanha_id.in_(
+            select(Campanha.id).where(Campanha.instituicao_id == instituicao_id)
+        ),
+    },
+}
+
+def filtros_indisponiveis(nome, status=None, instituicao_id=None):
+    """
+    Lista os filtros informados que a exportação não aceita.
+
+    Args:
+        nome (str): Nome da exportação (chave de EXPORTACOES)
+        status (str, optional): Filtro de status
+        instituicao_id (int, optional): Filtro de instituição
+
+    Returns:
+        list: Nomes dos filtros não suportados
+    """
+    exportacao = EXPORTACOES[nome]
+    informados = (('status', 'status', status), ('instituicao_id', 'instituicao', instituicao_id))
+    return [filtro for filtro, chave, valor in informados
+            if valor is not None and exportacao[chave] is None]
+
+def _consultas(nome, inicio, fim, status, instituicao_id):
+    exportacao = EXPORTACOES[nome]
+    modelo = exportacao['modelo']
+    tabelas = [modelo.__table__]
+
+    # Os logs antigos estão nas tabelas mensais; elas vêm antes do log atual, do mês mais antigo ao mais novo
+    if modelo is LogAcaoModerador:
+        periodos = db.session.query(ArquivoLogModeracao.periodo).order_by(ArquivoLogModeracao.periodo)
+        if inicio is not None:
+            periodos = periodos.filter(ArquivoLogModeracao.periodo >= inicio.strftime('%Y-%m'))
+        if fim is not None:
+            periodos = periodos.filter(ArquivoLogModeracao.periodo <= fim.strftime('%Y-%m'))
+        tabelas = [tabela_arquivo(periodo) for periodo, in periodos] + tabelas
+
+    consultas = []
+    for tabela in tabelas:
+        consulta = select(tabela)
+        data = tabela.c[exportacao['data']]
+        if inicio is not None:
+            consulta = consulta.where(data >= inicio)
+        if fim is not None:
+            consulta = consulta.where(data < fim)
+        if status is not None:
+            consulta = consulta.where(tabela.c[exportacao['status']] == status)
+        if instituicao_id is not None:
+            consulta = consulta.where(exportacao['instituicao'](instituicao_id))
+        consultas.append(consulta.order_by(tabela.c.id))
+    return consultas
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+def _celula_csv(valor):
+    valor = _serializar(valor)
+    # Texto começando com =, +, - ou @ viraria fórmula ao abrir o CSV em uma planilha
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    return valor
+
+def gerar_exportacao(nome, formato, inicio=None, fim=None, status=None, instituicao_id=None, tamanho_lote=1000):
+    """
+    Gera o conteúdo da exportação em pedaços, um por lote de linhas lidas do banco.
+
+    Args:
+        nome (str): Nome da exportação (chave de EXPORTACOES)
+        formato (str): 'csv' ou 'jsonl'
+        inicio (datetime, optional): Início do período (inclusivo)
+        fim (datetime, optional): Fim do período (exclusivo)
+        status (str, optional): Status das solicitações
+        instituicao_id (int, optional): Instituição à qual as solicitações foram delegadas
+            (ou dona da campanha, nas doações de campanha)
+        tamanho_lote (int): Linhas lidas do banco por vez
+
+    Yields:
+        str: Pedaço do arquivo exportado
+    """
+    colunas = [coluna.name for coluna in EXPORTACOES[nome]['modelo'].__table__.columns]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    if formato == 'csv':
+        escritor.writerow(colunas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    for consulta in _consultas(nome, inicio, fim, status, instituicao_id):
+        resultado = db.session.execute(consulta, execution_options={'yield_per': tamanho_lote})
+        for lote in resultado.partitions():
+            for linha in lote:
+                if formato == 'csv':
+                    escritor.writerow([_celula_csv(valor) for valor in linha])
+                else:
+                    registro = {coluna: _serializar(valor) for coluna, valor in zip(colunas, linha)}
+                    buffer.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
@@ -0,0 +1,57 @@
+import threading
+import time
+from flask import current_app
+from models import Campanha
+from db import db
+
+_cache_localizacoes = {'valor': None, 'expira_em': 0.0}
+_lock = threading.Lock()
+
+def obter_localizacoes_ativas():
+    """
+    Obtém as localizações distintas das campanhas ativas, com a quantidade de campanhas em cada uma.
+
+    O resultado é calculado com GROUP BY no banco e mantido em cache em memória
+    até ser invalidado por uma mudança de campanha ou até expirar o TTL
+    (FACETAS_TTL, em segundos), o que cobre alterações feitas por outros workers.
+
+    Returns:
+        list: Lista de tuplas (localizacao, total) ordenada por localização
+    """
+    agora = time.monotonic()
+    with _lock:
+        if _cache_localizacoes['valor'] is not None and agora < _cache_localizacoes['expira_em']:
+            return _cache_localizacoes['valor']
+
+    try:
+        linhas = db.session.query(
+            Campanha.localizacao,
+            db.func.count(Campanha.id)
+        ).filter(
+            Campanha.status == 'ativa',
+            Campanha.localizacao.isnot(None),
+            Campanha.localizacao != ''
+        ).group_by(
+            Campanha.localizacao
+        ).order_by(
+            Campanha.localizacao.asc()
+        ).all()
+        localizacoes = [(localizacao, total) for localizacao, total in linhas]
+    except Exception as e:
+        print(f"Erro ao obter localizações das campanhas: {e}")
+        return []
+
+    ttl = current_app.config.get('FACETAS_TTL', 300)
+    with _lock:
+        _cache_localizacoes['valor'] = localizacoes
+        _cache_localizacoes['expira_em'] = agora + ttl
+    return localizacoes
+
+def invalidar_localizacoes():
+    """
+    Descarta o cache de localizações. Deve ser chamada sempre que uma campanha
+    for aprovada, ativada, suspensa, editada ou apagada.
+    """
+    with _lock:
+        _cache_localizacoes['valor'] = None
+        _cache_localizacoes['expira_em'] = 0.0
@@ -0,0 +1,334 @@
+"""
+Fila persistente de emails de saída.
+
+enfileirar_email só grava o email na tabela fila_emails (na transação de quem
+chamou), então a requisição não espera pelo servidor SMTP. Uma thread em
+segundo plano (iniciar_envio_emails) drena a fila: reserva um lote de até
+EMAIL_LOTE emails, envia todos pela mesma conexão SMTP e registra o resultado
+de cada um.
+
+Um envio que falha volta para a fila com espera exponencial (EMAIL_BACKOFF_BASE
+segundos, dobrando a cada tentativa, até EMAIL_BACKOFF_MAXIMO). Depois de
+EMAIL_TENTATIVAS_MAXIMAS tentativas o email fica com status 'falhou' e aparece
+em listar_falhas, de onde pode ser reenfileirado.
+
+A reserva do lote grava um token em reservado_por e adia proxima_tentativa em
+EMAIL_RESERVA_SEGUNDOS, então vários workers podem drenar a mesma fila sem
+enviar o mesmo email duas vezes; se um worker morrer no meio do lote, os
+emails reservados voltam a ficar disponíveis quando a reserva vence.
+
+A conexão SMTP fica aberta entre um lote e outro e só é fechada depois de
+EMAIL_CONEXAO_OCIOSA segundos sem uso, então uma sequência de lotes (o envio
+de uma notificação para muitos destinatários, por exemplo) faz um único
+handshake com o servidor.
+"""
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import event, func, insert, select, update
+from db import db
+from models import EmailFila
+from replicas import SessaoRoteada
+
+PADRAO = {
+    'EMAIL_INTERVALO': 5,
+    'EMAIL_LOTE': 50,
+    'EMAIL_TENTATIVAS_MAXIMAS': 6,
+    'EMAIL_BACKOFF_BASE': 30,
+    'EMAIL_BACKOFF_MAXIMO': 3600,
+    'EMAIL_RESERVA_SEGUNDOS': 300,
+    'EMAIL_RETENCAO_DIAS': 7,
+    'EMAIL_CONEXAO_OCIOSA': 30,
+}
+
+def _erro_de_conexao(erro):
+    # Conexão caída encerra o lote; qualquer outro erro (destinatário recusado, cabeçalho
+    # inválido...) diz respeito só ao email atual. SMTPException também é um OSError.
+    return isinstance(erro, smtplib.SMTPServerDisconnected) or (
+        isinstance(erro, OSError) and not isinstance(erro, smtplib.SMTPException))
+
+# Acorda a thread de envio quando um email novo é confirmado no banco
+_acordar = threading.Event()
+
+# Conexão SMTP reaproveitada entre lotes; o lock impede dois envios simultâneos por ela
+_smtp = {'conexao': None, 'usada_em': 0.0}
+_lock_envio = threading.Lock()
+
+def _config(chave):
+    return current_app.config.get(chave, PADRAO[chave])
+
+def enfileirar_email(destinatario, assunto, corpo_html):
+    """
+    Coloca um email na fila de envio. O email só é gravado no commit de quem chamou.
+
+    Args:
+        destinatario (str): Email do destinatário
+        assunto (str): Assunto
+        corpo_html (str): Corpo em HTML
+
+    Returns:
+        EmailFila: O email adicionado à sessão
+    """
+    email = EmailFila(destinatario=destinatario, assunto=assunto, corpo_html=corpo_html,
+                      status='pendente', tentativas=0, proxima_tentativa=datetime.utcnow())
+    db.session.add(email)
+    return email
+
+def enfileirar_varios(emails):
+    """
+    Coloca vários emails na fila com um único INSERT. Os emails só são gravados
+    no commit de quem chamou.
+
+    Args:
+        emails (list): Dicionários com destinatario, assunto e corpo_html
+
+    Returns:
+        int: Quantidade de emails enfileirados
+    """
+    if not emails:
+        return 0
+    agora = datetime.utcnow()
+    db.session.execute(insert(EmailFila), [
+        dict(email, status='pendente', tentativas=0, proxima_tentativa=agora, criado_em=agora)
+        for email in emails
+    ])
+    # O INSERT em massa não passa pelo flush do ORM; a thread de envio é acordada no commit
+    db.session.info['emails_novos'] = True
+    return len(emails)
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _anotar_emails_novos(sessao, _contexto):
+    if any(isinstance(obj, EmailFila) for obj in sessao.new):
+        sessao.info['emails_novos'] = True
+
+@event.listens_for(SessaoRoteada, 'after_commit')
+def _acordar_envio(sessao):
+    if sessao.info.pop('emails_novos', False):
+        _acordar.set()
+
+@event.listens_for(SessaoRoteada, 'after_rollback')
+def _descartar_emails_novos(sessao):
+    sessao.info.pop('emails_novos', None)
+
+def _proxima_tentativa(tentativas, agora):
+    espera = min(_config('EMAIL_BACKOFF_MAXIMO'), _config('EMAIL_BACKOFF_BASE') * 2 ** (tentativas - 1))
+    # Um pouco de variação para os emails que falharam juntos não voltarem todos juntos
+    return agora + timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+def _reservar_lote():
+    agora = datetime.utcnow()
+    token = uuid.uuid4().hex
+    disponiveis = (select(EmailFila.id)
+                   .where(EmailFila.status == 'pendente', EmailFila.proxima_tentativa <= agora)
+                   .order_by(EmailFila.proxima_tentativa)
+                   .limit(_config('EMAIL_LOTE')))
+    # As condições repetidas fora da subconsulta impedem que dois workers reservem o mesmo email
+    db.session.execute(
+        update(EmailFila)
+        .where(EmailFila.id.in_(disponiveis.scalar_subquery()),
+               EmailFila.status == 'pendente',
+               EmailFila.proxima_tentativa <= agora)
+        .values(reservado_por=token,
+                proxima_tentativa=agora + timedelta(seconds=_config('EMAIL_RESERVA_SEGUNDOS')))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return EmailFila.query.filter_by(reservado_por=token, status='pendente').order_by(EmailFila.id).all()
+
+def _registrar_envio(email):
+    email.status = 'enviado'
+    email.tentativas += 1
+    email.enviado_em = datetime.utcnow()
+    email.reservado_por = None
+    email.ultimo_erro = None
+    db.session.commit()
+
+def _registrar_falha(email, erro):
+    agora = datetime.utcnow()
+    email.tentativas += 1
+    email.reservado_por = None
+    email.ultimo_erro = str(erro)[:500]
+    if email.tentativas >= _config('EMAIL_TENTATIVAS_MAXIMAS'):
+        email.status = 'falhou'
+    else:
+        email.proxima_tentativa = _proxima_tentativa(email.tentativas, agora)
+    db.session.commit()
+
+def _fechar_conexao():
+    conexao, _smtp['conexao'] = _smtp['conexao'], None
+    if conexao is not None and conexao.host is not None:
+        try:
+            conexao.host.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+def _obter_conexao():
+    conexao = _smtp['conexao']
+    if conexao is not None and time.monotonic() - _smtp['usada_em'] < _config('EMAIL_CONEXAO_OCIOSA'):
+        try:
+            if conexao.host is None or conexao.host.noop()[0] == 250:
+                return conexao
+        except (smtplib.SMTPException, OSError):
+            pass
+    _fechar_conexao()
+    # __enter__ abre a conexão (ou nenhuma, com MAIL_SUPPRESS_SEND); ela é fechada por _fechar_conexao
+    conexao = current_app.extensions['mail'].connect().__enter__()
+    _smtp['conexao'] = conexao
+    return conexao
+
+def fechar_conexao_ociosa():
+    """Fecha a conexão SMTP reaproveitada se ela está sem uso há mais de EMAIL_CONEXAO_OCIOSA segundos."""
+    with _lock_envio:
+        if _smtp['conexao'] is not None and time.monotonic() - _smtp['usada_em'] >= _config('EMAIL_CONEXAO_OCIOSA'):
+            _fechar_conexao()
+
+def processar_fila():
+    """
+    Reserva um lote de emails pendentes e envia todos pela conexão SMTP reaproveitada.
+
+    Returns:
+        tuple: (quantidade reservada, enviados, falhas)
+    """
+    emails = _reservar_lote()
+    if not emails:
+        return 0, 0, 0
+
+    enviados = falhas = 0
+    restantes = list(emails)
+    with _lock_envio:
+        try:
+            conexao = _obter_conexao()
+            while restantes:
+                email = restantes[0]
+                try:
+                    conexao.send(Message(email.assunto, recipients=[email.destinatario], html=email.corpo_html))
+                except Exception as e:
+                    if _erro_de_conexao(e):
+                        raise
+                    _registrar_falha(email, e)
+                    falhas += 1
+                else:
+                    _registrar_envio(email)
+                    enviados += 1
+                _smtp['usada_em'] = time.monotonic()
+                restantes.pop(0)
+        except (smtplib.SMTPException, OSError) as e:
+            print(f"Erro na conexão SMTP; {len(restantes)} emails voltam para a fila: {e}")
+            _fechar_conexao()
+            for email in restantes:
+                _registrar_falha(email, e)
+                falhas += 1
+
+    return len(emails), enviados, falhas
+
+def remover_enviados_antigos():
+    """
+    Apaga os emails enviados há mais de EMAIL_RETENCAO_DIAS dias.
+
+    Returns:
+        int: Quantidade de emails apagados
+    """
+    limite = datetime.utcnow() - timedelta(days=_config('EMAIL_RETENCAO_DIAS'))
+    resultado = db.session.execute(
+        EmailFila.__table__.delete().where(EmailFila.status == 'enviado', EmailFila.enviado_em < limite)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+def listar_falhas(limite=100):
+    """
+    Emails que esgotaram as tentativas (a "dead letter" da fila), mais recentes primeiro.
+
+    Args:
+        limite (int): Quantidade máxima de emails
+
+    Returns:
+        list: Objetos EmailFila com status 'falhou'
+    """
+    return (EmailFila.query.filter_by(status='falhou')
+            .order_by(EmailFila.id.desc()).limit(limite).all())
+
+def reenfileirar(email_id):
+    """
+    Devolve para a fila um email que falhou, com as tentativas zeradas.
+
+    Args:
+        email_id (int): ID do email
+
+    Returns:
+        bool: True se o email existia com status 'falhou'
+    """
+    email = db.session.get(EmailFila, email_id)
+    if not email or email.status != 'falhou':
+        return False
+    email.status = 'pendente'
+    email.tentativas = 0
+    email.proxima_tentativa = datetime.utcnow()
+    db.session.commit()
+    _acordar.set()
+    return True
+
+def metricas_fila_emails():
+    """
+    Situação atual da fila de emails.
+
+    Returns:
+        dict: Quantidade por status, pendentes já vencidos e data do pendente mais antigo
+    """
+    agora = datetime.utcnow()
+    por_status = dict(db.session.query(EmailFila.status, func.count(EmailFila.id)).group_by(EmailFila.status).all())
+    vencidos, mais_antigo = db.session.query(
+        func.count(EmailFila.id), func.min(EmailFila.criado_em)
+    ).filter(EmailFila.status == 'pendente', EmailFila.proxima_tentativa <= agora).one()
+    return {
+        'pendentes': por_status.get('pendente', 0),
+        'enviados': por_status.get('enviado', 0),
+        'falhas': por_status.get('falhou', 0),
+        'vencidos': vencidos,
+        'pendente_mais_antigo': mais_antigo.strftime('%d/%m/%Y %H:%M:%S') if mais_antigo else None,
+    }
+
+def iniciar_envio_emails(app):
+    """
+    Inicia a thread daemon que drena a fila de emails.
+
+    A thread envia lotes seguidos enquanto houver emails vencidos e, quando a
+    fila esvazia, espera EMAIL_INTERVALO segundos ou até um email novo ser
+    confirmado no banco.
+
+    Args:
+        app: Aplicação Flask
+
+    Returns:
+        threading.Thread: A thread iniciada, ou None se EMAIL_INTERVALO for 0
+    """
+    intervalo = float(app.config.get('EMAIL_INTERVALO', PADRAO['EMAIL_INTERVALO']))
+    if intervalo <= 0:
+        return None
+
+    def _laco():
+        ultima_limpeza = 0
+        while True:
+            reservados = 0
+            try:
+                with app.app_context():
+                    reservados, _, _ = processar_fila()
+                    if time.monotonic() - ultima_limpeza > 3600:
+                        remover_enviados_antigos()
+                        ultima_limpeza = time.monotonic()
+            except Exception as e:
+                print(f"Erro no envio da fila de emails: {e}")
+            if reservados < app.config.get('EMAIL_LOTE', PADRAO['EMAIL_LOTE']):
+                _acordar.wait(intervalo)
+                _acordar.clear()
+                with app.app_context():
+                    fechar_conexao_ociosa()
+
+    thread = threading.Thread(target=_laco, name='fila-emails', daemon=True)
+    thread.start()
+    return thread
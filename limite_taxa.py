@@ -0,0 +1,171 @@
+"""
+Limite de tentativas por IP e por email (token bucket).
+
+Cada regra é uma string '<tentativas>/<segundos>' na configuração (ex:
+LIMITE_LOGIN_EMAIL = '5/300'): o balde começa cheio com <tentativas> fichas,
+cada tentativa gasta uma e as fichas voltam continuamente, uma a cada
+<segundos>/<tentativas>. Assim a janela desliza, sem o pico permitido na
+virada de uma janela fixa.
+
+verificar_tentativa só consulta os baldes, sem gastar fichas: serve para
+limites que só devem contar tentativas que falharam (ex: senha errada no
+login), gastas depois com consumir_tentativa.
+
+Os baldes ficam na memória do processo. Com vários workers na mesma máquina,
+LIMITE_TAXA_ARQUIVO aponta para um arquivo SQLite compartilhado entre eles.
+As chaves são gravadas como hash, então emails e IPs não ficam no arquivo.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+_DDL_BALDES = """
+    CREATE TABLE IF NOT EXISTS baldes (
+        chave TEXT PRIMARY KEY,
+        fichas REAL NOT NULL,
+        atualizado_em REAL NOT NULL
+    )
+"""
+
+# Baldes sem uso há mais que isso já estão cheios de novo e podem ser descartados
+_DESCARTE_SEGUNDOS = 24 * 3600
+_LIMPEZA_A_CADA = 1000
+
+def _regra(texto):
+    tentativas, segundos = texto.split('/')
+    return float(tentativas), float(segundos)
+
+def _reabastecer(fichas, atualizado_em, capacidade, periodo, agora):
+    if fichas is None:
+        return capacidade
+    return min(capacidade, fichas + (agora - atualizado_em) * capacidade / periodo)
+
+def _gastar(fichas, capacidade, periodo):
+    if fichas >= 1:
+        return fichas - 1, 0.0
+    return fichas, (1 - fichas) * periodo / capacidade
+
+class BaldesMemoria:
+    """Baldes em um dicionário do processo."""
+
+    def __init__(self):
+        self._baldes = {}
+        self._lock = threading.Lock()
+        self._chamadas = 0
+
+    def consumir(self, chave, capacidade, periodo, agora):
+        with self._lock:
+            fichas, atualizado_em = self._baldes.get(chave, (None, agora))
+            fichas = _reabastecer(fichas, atualizado_em, capacidade, periodo, agora)
+            fichas, espera = _gastar(fichas, capacidade, periodo)
+            self._baldes[chave] = (fichas, agora)
+
+            self._chamadas += 1
+            if self._chamadas % _LIMPEZA_A_CADA == 0:
+                self._baldes = {c: v for c, v in self._baldes.items() if agora - v[1] < _DESCARTE_SEGUNDOS}
+        return espera
+
+    def consultar(self, chave, capacidade, periodo, agora):
+        with self._lock:
+            fichas, atualizado_em = self._baldes.get(chave, (None, agora))
+        fichas = _reabastecer(fichas, atualizado_em, capacidade, periodo, agora)
+        return _gastar(fichas, capacidade, periodo)[1]
+
+class BaldesSqlite:
+    """Baldes em um arquivo SQLite, compartilhados pelos workers da mesma máquina."""
+
+    def __init__(self, caminho):
+        self._caminho = caminho
+        self._chamadas = 0
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(_DDL_BALDES)
+
+    def _conectar(self):
+        return sqlite3.connect(self._caminho, timeout=5, isolation_level=None)
+
+    def consumir(self, chave, capacidade, periodo, agora):
+        conexao = self._conectar()
+        try:
+            # BEGIN IMMEDIATE: leitura e escrita do balde sem outro worker no meio
+            conexao.execute("BEGIN IMMEDIATE")
+            linha = conexao.execute("SELECT fichas, atualizado_em FROM baldes WHERE chave = ?", (chave,)).fetchone()
+            fichas, atualizado_em = linha if linha else (None, agora)
+            fichas = _reabastecer(fichas, atualizado_em, capacidade, periodo, agora)
+            fichas, espera = _gastar(fichas, capacidade, periodo)
+            conexao.execute("INSERT OR REPLACE INTO baldes (chave, fichas, atualizado_em) VALUES (?, ?, ?)",
+                            (chave, fichas, agora))
+
+            self._chamadas += 1
+            if self._chamadas % _LIMPEZA_A_CADA == 0:
+                conexao.execute("DELETE FROM baldes WHERE atualizado_em < ?", (agora - _DESCARTE_SEGUNDOS,))
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+        return espera
+
+    def consultar(self, chave, capacidade, periodo, agora):
+        conexao = self._conectar()
+        try:
+            linha = conexao.execute("SELECT fichas, atualizado_em FROM baldes WHERE chave = ?", (chave,)).fetchone()
+        finally:
+            conexao.close()
+        fichas, atualizado_em = linha if linha else (None, agora)
+        fichas = _reabastecer(fichas, atualizado_em, capacidade, periodo, agora)
+        return _gastar(fichas, capacidade, periodo)[1]
+
+_armazenamento = {'baldes': None}
+_lock = threading.Lock()
+
+def _obter_baldes():
+    with _lock:
+        if _armazenamento['baldes'] is None:
+            arquivo = current_app.config.get('LIMITE_TAXA_ARQUIVO')
+            _armazenamento['baldes'] = BaldesSqlite(arquivo) if arquivo else BaldesMemoria()
+        return _armazenamento['baldes']
+
+def _aplicar(operacao, limites):
+    baldes = _obter_baldes()
+    agora = time.time()
+    espera = 0.0
+    for regra, identificador in limites:
+        if not identificador:
+            continue
+        capacidade, periodo = _regra(current_app.config[regra])
+        identificador = str(identificador).strip().lower()
+        chave = hashlib.sha256(f'{regra}:{identificador}'.encode('utf-8')).hexdigest()
+        try:
+            espera = max(espera, getattr(baldes, operacao)(chave, capacidade, periodo, agora))
+        except sqlite3.Error as e:
+            # Sem o arquivo compartilhado, a tentativa passa: o limite não pode derrubar o login
+            print(f"Erro no limite de tentativas ({regra}): {e}")
+    return espera
+
+def consumir_tentativa(*limites):
+    """
+    Gasta uma ficha de cada balde informado.
+
+    Args:
+        *limites: Tuplas (chave de configuração da regra, identificador), ex:
+            ('LIMITE_LOGIN_IP', request.remote_addr), ('LIMITE_LOGIN_EMAIL', email).
+            Identificadores vazios são ignorados.
+
+    Returns:
+        float: 0 se a tentativa é permitida; senão, segundos até a próxima ficha
+    """
+    return _aplicar('consumir', limites)
+
+def verificar_tentativa(*limites):
+    """
+    Confere se cada balde informado tem ficha, sem gastá-la.
+
+    Args:
+        *limites: Tuplas (chave de configuração da regra, identificador), como em
+            consumir_tentativa
+
+    Returns:
+        float: 0 se a tentativa é permitida; senão, segundos até a próxima ficha
+    """
+    return _aplicar('consultar', limites)
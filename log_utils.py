@@ -1,12 +1,16 @@
 from flask_login import current_user
 from flask import request
-from models import LogAcaoModerador
+from models import LogAcaoModerador, Usuario
 from db import db
+from arquivo_logs import buscar_logs_arquivados, contar_arquivados
 from datetime import datetime
 
 def registrar_acao_moderador(acao, tipo_item, item_id, item_nome, detalhes=None):
     """
     Registra uma ação realizada por um moderador no sistema.
+
+    O log é apenas adicionado à sessão, para ser gravado no mesmo commit da
+    ação que ele descreve: quem chama faz o commit (e o rollback, em caso de erro).
     
     Args:
         acao (str): Tipo de ação realizada (ex: 'aprovou_campanha', 'rejeitou_recebimento')
@@ -39,14 +43,12 @@ def registrar_acao_moderador(acao, tipo_item, item_id, item_nome, detalhes=None)
         )
 
         db.session.add(novo_log)
-        db.session.commit()
         
         print(f"Log registrado: {current_user.nome} - {acao} - {tipo_item} #{item_id}")
         return novo_log
         
     except Exception as e:
         print(f"Erro ao registrar log de ação: {e}")
-        db.session.rollback()
         return None
 
 def obter_logs_recentes(limite=50):
@@ -71,6 +73,8 @@ def obter_logs_recentes(limite=50):
 def obter_logs_por_moderador(moderador_id, limite=50):
     """
     Obtém os logs de um moderador específico.
+
+    Se o log atual não tiver registros suficientes, completa com os meses arquivados.
     
     Args:
         moderador_id (int): ID do moderador
@@ -85,6 +89,8 @@ def obter_logs_por_moderador(moderador_id, limite=50):
         ).order_by(
             LogAcaoModerador.data_acao.desc()
         ).limit(limite).all()
+        if len(logs) < limite:
+            logs.extend(buscar_logs_arquivados(limite - len(logs), moderador_id=moderador_id))
         return logs
     except Exception as e:
         print(f"Erro ao obter logs do moderador: {e}")
@@ -93,6 +99,8 @@ def obter_logs_por_moderador(moderador_id, limite=50):
 def obter_logs_por_tipo(tipo_item, limite=50):
     """
     Obtém logs filtrados por tipo de item.
+
+    Se o log atual não tiver registros suficientes, completa com os meses arquivados.
     
     Args:
         tipo_item (str): Tipo do item ('campanha', 'recebimento', etc.)
@@ -107,14 +115,30 @@ def obter_logs_por_tipo(tipo_item, limite=50):
         ).order_by(
             LogAcaoModerador.data_acao.desc()
         ).limit(limite).all()
+        if len(logs) < limite:
+            logs.extend(buscar_logs_arquivados(limite - len(logs), tipo_item=tipo_item))
         return logs
     except Exception as e:
         print(f"Erro ao obter logs por tipo: {e}")
         return []
 
+def _contadores(linhas_por_categoria):
+    contadores = {}
+    for categoria, total in linhas_por_categoria:
+        contadores[categoria] = contadores.get(categoria, 0) + total
+    return {
+        'total_acoes': sum(contadores.values()),
+        'aprovacoes': contadores.get('aprovacao', 0),
+        'rejeicoes': contadores.get('rejeicao', 0),
+        'delegacoes': contadores.get('delegacao', 0)
+    }
+
 def obter_estatisticas_moderador(moderador_id):
     """
     Obtém estatísticas de ações de um moderador.
+
+    Todos os contadores saem de um único GROUP BY pela categoria da ação,
+    atendido pelo índice (moderador_id, categoria), somado ao resumo dos meses arquivados.
     
     Args:
         moderador_id (int): ID do moderador
@@ -123,34 +147,56 @@ def obter_estatisticas_moderador(moderador_id):
         dict: Dicionário com estatísticas
     """
     try:
-        total_acoes = LogAcaoModerador.query.filter_by(moderador_id=moderador_id).count()
-        
-        aprovacoes = LogAcaoModerador.query.filter(
-            LogAcaoModerador.moderador_id == moderador_id,
-            LogAcaoModerador.acao.like('%aprovou%')
-        ).count()
-        
-        rejeicoes = LogAcaoModerador.query.filter(
-            LogAcaoModerador.moderador_id == moderador_id,
-            LogAcaoModerador.acao.like('%rejeitou%')
-        ).count()
-        
-        delegacoes = LogAcaoModerador.query.filter(
-            LogAcaoModerador.moderador_id == moderador_id,
-            LogAcaoModerador.acao.like('%delegou%')
-        ).count()
-        
-        return {
-            'total_acoes': total_acoes,
-            'aprovacoes': aprovacoes,
-            'rejeicoes': rejeicoes,
-            'delegacoes': delegacoes
-        }
+        linhas = db.session.query(
+            LogAcaoModerador.categoria,
+            db.func.count(LogAcaoModerador.id)
+        ).filter(
+            LogAcaoModerador.moderador_id == moderador_id
+        ).group_by(LogAcaoModerador.categoria).all()
+
+        return _contadores(linhas + contar_arquivados('categoria', moderador_id=moderador_id))
     except Exception as e:
         print(f"Erro ao obter estatísticas do moderador: {e}")
-        return {
-            'total_acoes': 0,
-            'aprovacoes': 0,
-            'rejeicoes': 0,
-            'delegacoes': 0
-        }
\ No newline at end of file
+        return _contadores([])
+
+def obter_estatisticas_moderadores():
+    """
+    Obtém as estatísticas de todos os moderadores com ações registradas: uma única
+    consulta ao log atual, somada ao resumo dos meses arquivados.
+    
+    Returns:
+        list: Lista de dicionários com moderador_id, nome e os contadores de
+              obter_estatisticas_moderador, ordenada pelo total de ações
+    """
+    try:
+        linhas = db.session.query(
+            LogAcaoModerador.moderador_id,
+            Usuario.nome,
+            LogAcaoModerador.categoria,
+            db.func.count(LogAcaoModerador.id)
+        ).join(
+            Usuario, Usuario.id == LogAcaoModerador.moderador_id
+        ).group_by(
+            LogAcaoModerador.moderador_id, Usuario.nome, LogAcaoModerador.categoria
+        ).all()
+        arquivadas = contar_arquivados('moderador_id', 'categoria')
+
+        por_moderador = {}
+        for moderador_id, nome, categoria, total in linhas:
+            item = por_moderador.setdefault(moderador_id, {'nome': nome, 'linhas': []})
+            item['linhas'].append((categoria, total))
+
+        sem_nome = {moderador_id for moderador_id, _, _ in arquivadas} - set(por_moderador)
+        nomes = dict(db.session.query(Usuario.id, Usuario.nome).filter(Usuario.id.in_(sem_nome))) if sem_nome else {}
+        for moderador_id, categoria, total in arquivadas:
+            item = por_moderador.setdefault(moderador_id, {'nome': nomes.get(moderador_id), 'linhas': []})
+            item['linhas'].append((categoria, total))
+    except Exception as e:
+        print(f"Erro ao obter estatísticas dos moderadores: {e}")
+        return []
+
+    estatisticas = [
+        dict(moderador_id=moderador_id, nome=item['nome'], **_contadores(item['linhas']))
+        for moderador_id, item in por_moderador.items()
+    ]
+    return sorted(estatisticas, key=lambda e: e['total_acoes'], reverse=True)
@@ -1,24 +1,42 @@
 
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, current_user, login_required
 from flask_cors import CORS
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from itsdangerous import URLSafeTimedSerializer
-from models import Usuario, SolicitacaoDoacao, SolicitacaoRecebimento, Campanha, VoluntarioCampanha, Delegacao, DoacaoCampanha, LogAcaoModerador, DenunciaVoluntario
+from models import Usuario, SolicitacaoDoacao, SolicitacaoRecebimento, Campanha, VoluntarioCampanha, Delegacao, DoacaoCampanha, LogAcaoModerador, DenunciaVoluntario, Advertencia
 import traceback
 from db import db
 from requests_oauthlib import OAuth2Session
-import hashlib
 import os
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import uuid
 import pyotp
-import qrcode
-import io
-import base64
 import json
+import click
 from sqlalchemy import or_
+from paginacao import paginar_keyset
+from facetas import obter_localizacoes_ativas, invalidar_localizacoes
+from busca import filtrar_busca, destaques_busca, criar_indice_busca, reconstruir_indice_busca
+from migracoes import migrar, reverter, versao_atual, versao_mais_recente
+from perfil_sqlite import aplicar_perfil_sqlite, iniciar_manutencao_periodica, executar_manutencao
+from replicas import binds_das_replicas, iniciar_replicas, somente_leitura
+from moderacao_utils import contar_pendencias_moderacao, carregar_secao_moderacao, listar_instituicoes_aprovadas, resumo_usuarios, SECOES_PAGINADAS
+from estatisticas_moderacao import obter_estatisticas_moderacao
+from arquivo_logs import arquivar_logs
+from principal import carregar_principal
+from senhas import gerar_hash, precisa_rehash
+from limite_taxa import consumir_tentativa, verificar_tentativa
+from qrcode_2fa import FORMATOS as FORMATOS_QRCODE, chave_qrcode, obter_qrcode, invalidar_qrcode
+from totp_2fa import verificar_codigo_totp, esquecer_totp
+from fila_emails import enfileirar_email, processar_fila, iniciar_envio_emails, listar_falhas, reenfileirar, metricas_fila_emails
+from notificacoes import notificar_status_campanha, notificar_delegacao_nova, notificar_status_delegacao
+from pool_senhas import ServicoSaturado, verificar_senha_no_pool, gerar_hash_no_pool, metricas_pool_senhas
+from exportacao import EXPORTACOES, FORMATOS, filtros_indisponiveis, gerar_exportacao
+from campanha_utils import com_num_voluntarios, anexar_num_voluntarios, listar_com_num_voluntarios
 
 
 app = Flask(__name__, static_folder='static')
@@ -28,18 +46,35 @@ app.secret_key = 'soscomida_secret_key_2024'
 # Configuração do Flask-Mail (ajuste para seu provedor)
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'seu_email@gmail.com')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'senha_do_email')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'SOS Comida <seu_email@gmail.com>')
+app.config['MAIL_SUPPRESS_SEND'] = os.environ.get('MAIL_SUPPRESS_SEND', '0') == '1'
+
+# Fila de emails de saída (ver fila_emails.py); EMAIL_INTERVALO = 0 desliga a thread de envio
+app.config['EMAIL_INTERVALO'] = float(os.environ.get('EMAIL_INTERVALO', 5))
+app.config['EMAIL_LOTE'] = int(os.environ.get('EMAIL_LOTE', 50))
+app.config['EMAIL_TENTATIVAS_MAXIMAS'] = int(os.environ.get('EMAIL_TENTATIVAS_MAXIMAS', 6))
+app.config['EMAIL_BACKOFF_BASE'] = float(os.environ.get('EMAIL_BACKOFF_BASE', 30))
+app.config['EMAIL_BACKOFF_MAXIMO'] = float(os.environ.get('EMAIL_BACKOFF_MAXIMO', 3600))
+app.config['EMAIL_RESERVA_SEGUNDOS'] = int(os.environ.get('EMAIL_RESERVA_SEGUNDOS', 300))
+app.config['EMAIL_RETENCAO_DIAS'] = int(os.environ.get('EMAIL_RETENCAO_DIAS', 7))
+app.config['EMAIL_CONEXAO_OCIOSA'] = float(os.environ.get('EMAIL_CONEXAO_OCIOSA', 30))
+
+# Notificações por email (ver notificacoes.py)
+app.config['NOTIFICACOES_LOCALE'] = os.environ.get('NOTIFICACOES_LOCALE', 'pt_BR')
+app.config['NOTIFICACOES_CACHE_MAXIMO'] = int(os.environ.get('NOTIFICACOES_CACHE_MAXIMO', 128))
+app.config['NOTIFICACOES_LOTE_INSERCAO'] = int(os.environ.get('NOTIFICACOES_LOTE_INSERCAO', 500))
 
 mail = Mail(app)
 serializer = URLSafeTimedSerializer(app.secret_key)
 
 def enviar_email(destinatario, assunto, corpo_html):
+    """Coloca o email na fila de envio e confirma; o envio SMTP fica com a thread da fila."""
     try:
-        msg = Message(assunto, recipients=[destinatario], html=corpo_html)
-        mail.send(msg)
+        enfileirar_email(destinatario, assunto, corpo_html)
+        db.session.commit()
         return True
     except Exception as e:
         print(f"Erro ao enviar e-mail: {e}")
@@ -52,17 +87,119 @@ lm.login_view = 'login'
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 database_path = os.path.join(basedir, 'instance', 'database.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+# DATABASE_URL permite apontar vários workers para um PostgreSQL compartilhado
+# (requer psycopg2); sem ela, continua usando o SQLite local em instance/
+database_url = os.environ.get('DATABASE_URL', f'sqlite:///{database_path}')
+if database_url.startswith('postgres://'):
+    database_url = 'postgresql://' + database_url[len('postgres://'):]
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Pool de conexões por worker. pool_pre_ping descarta conexões derrubadas pelo
+# servidor e pool_recycle as renova antes do idle timeout do banco/proxy
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+}
+if not database_url.startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    })
+
+# Paginação da listagem pública de campanhas
+app.config['CAMPANHAS_POR_PAGINA'] = int(os.environ.get('CAMPANHAS_POR_PAGINA', 12))
+app.config['CAMPANHAS_POR_PAGINA_MAX'] = int(os.environ.get('CAMPANHAS_POR_PAGINA_MAX', 48))
+# Acima disso a busca mostra "N+" em vez de contar todas as campanhas encontradas
+app.config['CAMPANHAS_CONTAGEM_MAXIMA'] = int(os.environ.get('CAMPANHAS_CONTAGEM_MAXIMA', 1000))
+app.config['FACETAS_TTL'] = int(os.environ.get('FACETAS_TTL', 300))
+app.config['MODERACAO_ITENS_POR_PAGINA'] = int(os.environ.get('MODERACAO_ITENS_POR_PAGINA', 20))
+app.config['ESTATISTICAS_TTL'] = int(os.environ.get('ESTATISTICAS_TTL', 60))
+app.config['ESTATISTICAS_DIAS'] = int(os.environ.get('ESTATISTICAS_DIAS', 30))
+app.config['ESTATISTICAS_MESES'] = int(os.environ.get('ESTATISTICAS_MESES', 12))
+app.config['LOGS_RETENCAO_MESES'] = int(os.environ.get('LOGS_RETENCAO_MESES', 6))
+app.config['EXPORTACAO_LOTE'] = int(os.environ.get('EXPORTACAO_LOTE', 1000))
+app.config['PRINCIPAL_TTL'] = int(os.environ.get('PRINCIPAL_TTL', 60))
+
+# Hash de senhas (ver senhas.py); alterar o custo regrava os hashes nos próximos logins
+app.config['SENHA_ALGORITMO'] = os.environ.get('SENHA_ALGORITMO', 'scrypt')
+app.config['SENHA_SCRYPT_N'] = int(os.environ.get('SENHA_SCRYPT_N', 2 ** 14))
+app.config['SENHA_SCRYPT_R'] = int(os.environ.get('SENHA_SCRYPT_R', 8))
+app.config['SENHA_SCRYPT_P'] = int(os.environ.get('SENHA_SCRYPT_P', 1))
+app.config['SENHA_PBKDF2_ITERACOES'] = int(os.environ.get('SENHA_PBKDF2_ITERACOES', 600000))
+# Pool que executa os hashes (ver pool_senhas.py); SENHA_WORKERS vazio usa um worker por núcleo
+app.config['SENHA_WORKERS'] = int(os.environ.get('SENHA_WORKERS') or os.cpu_count() or 1)
+app.config['SENHA_FILA_MAXIMA'] = int(os.environ.get('SENHA_FILA_MAXIMA', 4 * app.config['SENHA_WORKERS']))
+app.config['SENHA_ESPERA_MAXIMA'] = float(os.environ.get('SENHA_ESPERA_MAXIMA', 5))
+app.config['SENHA_RETRY_AFTER'] = int(os.environ.get('SENHA_RETRY_AFTER', 2))
+
+# Limites de tentativas, '<tentativas>/<segundos>' (ver limite_taxa.py); com vários
+# workers na mesma máquina, LIMITE_TAXA_ARQUIVO compartilha os contadores entre eles
+app.config['LIMITE_TAXA_ARQUIVO'] = os.environ.get('LIMITE_TAXA_ARQUIVO', '')
+app.config['LIMITE_LOGIN_IP'] = os.environ.get('LIMITE_LOGIN_IP', '20/300')
+app.config['LIMITE_LOGIN_EMAIL'] = os.environ.get('LIMITE_LOGIN_EMAIL', '5/300')
+app.config['LIMITE_2FA_IP'] = os.environ.get('LIMITE_2FA_IP', '20/300')
+app.config['LIMITE_2FA_USUARIO'] = os.environ.get('LIMITE_2FA_USUARIO', '5/300')
+app.config['LIMITE_REGISTRAR_IP'] = os.environ.get('LIMITE_REGISTRAR_IP', '5/3600')
+
+# QR Code do 2FA (ver qrcode_2fa.py); 'svg' dispensa o Pillow
+app.config['QR_2FA_FORMATO'] = os.environ.get('QR_2FA_FORMATO', 'png')
+app.config['QR_2FA_CACHE_MAXIMO'] = int(os.environ.get('QR_2FA_CACHE_MAXIMO', 256))
+app.config['QR_2FA_MAX_AGE'] = int(os.environ.get('QR_2FA_MAX_AGE', 300))
+
+# Códigos TOTP (ver totp_2fa.py): passos de 30s aceitos antes/depois do atual e cache dos objetos TOTP
+app.config['TOTP_JANELA'] = int(os.environ.get('TOTP_JANELA', 1))
+app.config['TOTP_CACHE_MAXIMO'] = int(os.environ.get('TOTP_CACHE_MAXIMO', 1024))
+app.config['TOTP_PASSOS_ARQUIVO'] = os.environ.get('TOTP_PASSOS_ARQUIVO', '')
+
+# Perfil de produção do SQLite, aplicado em cada nova conexão (ver perfil_sqlite.py)
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+app.config['SQLITE_TEMP_STORE'] = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+app.config['SQLITE_FOREIGN_KEYS'] = os.environ.get('SQLITE_FOREIGN_KEYS', '1') == '1'
+app.config['SQLITE_MANUTENCAO_INTERVALO'] = int(os.environ.get('SQLITE_MANUTENCAO_INTERVALO', 300))
+
+# Réplicas de leitura (ver replicas.py): URLs separadas por vírgula em DATABASE_REPLICA_URLS
+app.config['SQLALCHEMY_BINDS'] = binds_das_replicas(os.environ.get('DATABASE_REPLICA_URLS', ''))
+app.config['REPLICA_ATRASO_MAXIMO'] = float(os.environ.get('REPLICA_ATRASO_MAXIMO', 10))
+app.config['REPLICA_INTERVALO_VERIFICACAO'] = float(os.environ.get('REPLICA_INTERVALO_VERIFICACAO', 5))
+app.config['REPLICA_MARGEM_ESCRITA'] = float(os.environ.get('REPLICA_MARGEM_ESCRITA', 2))
+
 os.makedirs(os.path.join(basedir, 'instance'), exist_ok=True)
 db.init_app(app)
 
+with app.app_context():
+    aplicar_perfil_sqlite(db.engine, app.config)
+    iniciar_manutencao_periodica(db.engine, app.config)
+
+iniciar_replicas(app)
+iniciar_envio_emails(app)
+
 
 def hash_password(txt):
-    return hashlib.sha256(txt.encode('utf-8')).hexdigest()
+    return gerar_hash(txt)
+
+def resposta_servico_saturado(template, **contexto):
+    """Resposta 503 para quando o pool de hash de senhas está cheio."""
+    flash('Muitos acessos no momento. Tente novamente em alguns segundos.', 'error')
+    return render_template(template, **contexto), 503, {'Retry-After': str(app.config['SENHA_RETRY_AFTER'])}
+
+def resposta_limite_excedido(espera, template, **contexto):
+    """Resposta 429 para quando o limite de tentativas (ver limite_taxa.py) foi atingido."""
+    segundos = max(1, math.ceil(espera))
+    flash(f'Muitas tentativas. Tente novamente em {segundos} segundos.', 'error')
+    return render_template(template, **contexto), 429, {'Retry-After': str(segundos)}
+
+def uri_2fa(secret, email):
+    """URI otpauth:// do segredo TOTP, codificada no QR Code lido pelo aplicativo autenticador."""
+    return pyotp.totp.TOTP(secret).provisioning_uri(name=email, issuer_name="SOS Comida")
 
 def registrar_log(acao, tipo_item, item_id, item_nome, detalhes=None):
+    """Adiciona o log da ação à sessão; ele é gravado no mesmo commit da própria ação."""
     try:
         novo_log = LogAcaoModerador(
             moderador_id=current_user.id,
@@ -74,10 +211,8 @@ def registrar_log(acao, tipo_item, item_id, item_nome, detalhes=None):
             ip_address=request.remote_addr
         )
         db.session.add(novo_log)
-        db.session.commit()
     except Exception as e:
         print(f"Erro ao registrar log: {e}")
-        db.session.rollback()
 
 def create_initial_data():
     with app.app_context():
@@ -267,7 +402,7 @@ def create_initial_data():
 
 @lm.user_loader
 def user_loader(id):
-    return Usuario.query.get(int(id))
+    return carregar_principal(int(id))
 
 @app.route('/')
 def home():
@@ -290,7 +425,10 @@ def login():
             if not user_id:
                 flash('Sessão expirada. Faça login novamente.', 'error')
                 return redirect(url_for('login'))
-            
+
+            espera = consumir_tentativa(('LIMITE_2FA_IP', request.remote_addr), ('LIMITE_2FA_USUARIO', user_id))
+            if espera:
+                return resposta_limite_excedido(espera, 'login.html', show_2fa=True, usuario=None)
             
             user = Usuario.query.get(user_id)
             
@@ -299,8 +437,7 @@ def login():
                 flash('Usuário não encontrado. Faça login novamente.', 'error')
                 return redirect(url_for('login'))
 
-            totp = pyotp.TOTP(user.two_factor_secret)
-            if totp.verify(codigo_2fa):
+            if verificar_codigo_totp(user.id, user.two_factor_secret, codigo_2fa):
                 session.pop('user_id_pending_2fa', None)
                 login_user(user)
                 flash(f'Bem-vindo(a), {user.nome}!', 'success')
@@ -317,9 +454,30 @@ def login():
             if not email or not senha:
                 flash('Email e senha são obrigatórios.', 'error')
                 return render_template('login.html', show_2fa=False, usuario=None)
+
+            # Por IP, toda tentativa conta. Por email, só as de senha errada (gastas abaixo),
+            # para um login certo não consumir o limite da própria conta
+            espera = max(consumir_tentativa(('LIMITE_LOGIN_IP', request.remote_addr)),
+                         verificar_tentativa(('LIMITE_LOGIN_EMAIL', email)))
+            if espera:
+                return resposta_limite_excedido(espera, 'login.html', show_2fa=False, usuario=None)
             
-            
-            user = Usuario.query.filter_by(email=email, senha=hash_password(senha)).first()
+            user = Usuario.query.filter_by(email=email).first()
+            try:
+                senha_correta = verificar_senha_no_pool(senha, user.senha if user else None)
+            except ServicoSaturado:
+                return resposta_servico_saturado('login.html', show_2fa=False, usuario=None)
+
+            if not senha_correta:
+                consumir_tentativa(('LIMITE_LOGIN_EMAIL', email))
+                user = None
+            elif precisa_rehash(user.senha):
+                # Hash legado (SHA-256) ou de custo antigo: regravado agora que a senha é conhecida
+                try:
+                    user.senha = gerar_hash_no_pool(senha)
+                    db.session.commit()
+                except ServicoSaturado:
+                    pass  # Fica para o próximo login
             
             if user:
                 # ✅ VERIFICAR SE A CONTA FOI REVOGADA
@@ -348,6 +506,10 @@ def registrar():
         return redirect(url_for('home'))
     
     if request.method == 'POST':
+        espera = consumir_tentativa(('LIMITE_REGISTRAR_IP', request.remote_addr))
+        if espera:
+            return resposta_limite_excedido(espera, 'registrar.html')
+
         tipo_cadastro = request.form.get('tipo')
         email = request.form.get('email')
         senha = request.form.get('senha')
@@ -498,26 +660,31 @@ def configurar_2fa():
     else:
         secret = current_user.two_factor_secret
     
-    totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
-        name=current_user.email,
-        issuer_name="SOS Comida"
-    )
-    
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(totp_uri)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
-    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+    # A imagem vem de /2fa/qrcode.<formato>; a versão na URL muda junto com o segredo
+    versao_qrcode = chave_qrcode(secret, uri_2fa(secret, current_user.email))
     
     return render_template('configurar_2fa.html', 
-                           qr_code=img_base64, 
+                           formato_qrcode=app.config['QR_2FA_FORMATO'],
+                           versao_qrcode=versao_qrcode,
                            secret=secret,
                            usuario=current_user)
 
+@app.route('/2fa/qrcode.<formato>')
+@login_required
+def qrcode_2fa(formato):
+    """Imagem do QR Code da configuração do 2FA (PNG ou SVG), gerada uma vez por segredo"""
+    secret = current_user.two_factor_secret
+    if formato not in FORMATOS_QRCODE or current_user.two_factor_enabled or not secret:
+        return 'QR Code não disponível.', 404
+
+    chave, conteudo = obter_qrcode(secret, uri_2fa(secret, current_user.email), formato)
+    resposta = Response(conteudo, mimetype=FORMATOS_QRCODE[formato])
+    resposta.set_etag(chave)
+    # A imagem contém o segredo: só o navegador do próprio usuário pode guardá-la
+    resposta.cache_control.private = True
+    resposta.cache_control.max_age = app.config['QR_2FA_MAX_AGE']
+    return resposta.make_conditional(request)
+
 @app.route('/ativar_2fa', methods=['POST'])
 @login_required
 def ativar_2fa():
@@ -527,11 +694,10 @@ def ativar_2fa():
         flash('Erro: segredo 2FA não encontrado.', 'error')
         return redirect(url_for('configurar_2fa'))
     
-    totp = pyotp.TOTP(current_user.two_factor_secret)
-    
-    if totp.verify(codigo):
+    if verificar_codigo_totp(current_user.id, current_user.two_factor_secret, codigo):
         current_user.two_factor_enabled = True
         db.session.commit()
+        invalidar_qrcode(current_user.two_factor_secret)
         flash('Autenticação de 2 fatores ativada com sucesso!', 'success')
         return redirect(url_for('perfil'))
     else:
@@ -547,12 +713,13 @@ def desativar_2fa():
         flash('A autenticação de 2 fatores não está ativada.', 'info')
         return redirect(url_for('perfil'))
     
-    totp = pyotp.TOTP(current_user.two_factor_secret)
-    
-    if totp.verify(codigo):
+    if verificar_codigo_totp(current_user.id, current_user.two_factor_secret, codigo):
+        segredo_antigo = current_user.two_factor_secret
         current_user.two_factor_enabled = False
         current_user.two_factor_secret = None
         db.session.commit()
+        invalidar_qrcode(segredo_antigo)
+        esquecer_totp(current_user.id)
         flash('Autenticação de 2 fatores desativada com sucesso!', 'success')
     else:
         flash('Código inválido. Não foi possível desativar o 2FA.', 'error')
@@ -731,6 +898,7 @@ def formularioreceber():
     return render_template('formularioreceber.html', usuario=current_user)
 
 @app.route('/minhas_solicitacoes')
+@somente_leitura
 @login_required
 def minhas_solicitacoes():
     doacoes = SolicitacaoDoacao.query.filter_by(usuario_id=current_user.id).order_by(SolicitacaoDoacao.data_criacao.desc()).all()
@@ -744,43 +912,68 @@ def minhas_solicitacoes():
                            usuario=current_user)
 
 @app.route('/campanhas')
+@somente_leitura
 def campanhas():
     termo_busca = request.args.get('busca', '').strip()
     localizacao_filtro = request.args.get('localizacao', '').strip()
-    ordenacao = request.args.get('ordenacao', 'recentes')
+    ordenacao = request.args.get('ordenacao') or ('relevancia' if termo_busca else 'recentes')
 
-    query = Campanha.query.filter_by(status='ativa')
+    cursor = request.args.get('cursor', '').strip() or None
+    por_pagina = request.args.get('por_pagina', app.config['CAMPANHAS_POR_PAGINA'], type=int)
+    por_pagina = max(1, min(por_pagina, app.config['CAMPANHAS_POR_PAGINA_MAX']))
 
+    busca = None
     if termo_busca:
-        query = query.filter(Campanha.titulo.ilike(f'%{termo_busca}%'))
+        query, busca = filtrar_busca(Campanha.query, termo_busca, status='ativa',
+                                     relevancia=ordenacao == 'relevancia')
+    else:
+        query = Campanha.query.filter_by(status='ativa')
 
     if localizacao_filtro:
         query = query.filter(Campanha.localizacao.ilike(f'%{localizacao_filtro}%'))
 
-    if ordenacao == 'alfabetica':
-        query = query.order_by(Campanha.titulo.asc())
+    total_encontradas, total_limitado = None, False
+    if termo_busca or localizacao_filtro:
+        # A contagem para em CAMPANHAS_CONTAGEM_MAXIMA + 1, para não percorrer todo o resultado
+        maximo = app.config['CAMPANHAS_CONTAGEM_MAXIMA']
+        amostra = query.with_entities(Campanha.id).limit(maximo + 1).subquery()
+        total_encontradas = db.session.query(db.func.count()).select_from(amostra).scalar()
+        total_limitado = total_encontradas > maximo
+        total_encontradas = min(total_encontradas, maximo)
+
+    query, num_voluntarios = com_num_voluntarios(query)
+    if busca is not None:
+        query = query.add_columns(busca.c.rank)
+
+    if ordenacao == 'relevancia' and busca is not None:
+        colunas_ordem = [(busca.c.rank, 'asc'), (Campanha.id, 'asc')]
+        chave = lambda linha: (linha[2], linha[0].id)
+    elif ordenacao == 'alfabetica':
+        colunas_ordem = [(Campanha.titulo, 'asc'), (Campanha.id, 'asc')]
+        chave = lambda linha: (linha[0].titulo, linha[0].id)
     elif ordenacao == 'proximas_meta':
-        pass
+        colunas_ordem = [(Campanha.progresso_meta, 'desc'), (Campanha.id, 'desc')]
+        chave = lambda linha: (linha[0].progresso_meta, linha[0].id)
     elif ordenacao == 'mais_voluntarios':
-        from sqlalchemy import func
-        query = query.outerjoin(VoluntarioCampanha).group_by(Campanha.id).order_by(
-            func.count(VoluntarioCampanha.id).desc()
-        )
+        colunas_ordem = [(num_voluntarios, 'desc'), (Campanha.id, 'desc')]
+        chave = lambda linha: (linha[1], linha[0].id)
     else:
-        query = query.order_by(Campanha.data_criacao.desc())
+        colunas_ordem = [(Campanha.data_criacao, 'desc'), (Campanha.id, 'desc')]
+        chave = lambda linha: (linha[0].data_criacao, linha[0].id)
 
-    campanhas_ativas = query.all()
+    linhas, proximo_cursor = paginar_keyset(query, ordenacao, colunas_ordem, chave,
+                                            cursor=cursor, tamanho=por_pagina)
+
+    campanhas_ativas = anexar_num_voluntarios([linha[:2] for linha in linhas])
+    if termo_busca:
+        destaques = destaques_busca(termo_busca, [campanha.id for campanha in campanhas_ativas])
+        for campanha in campanhas_ativas:
+            campanha.titulo_destacado, campanha.trecho_busca = destaques.get(campanha.id, (None, None))
 
     for campanha in campanhas_ativas:
-        campanha.num_voluntarios = len(campanha.voluntarios)
-        if campanha.meta_doacoes and campanha.meta_doacoes > 0:
-            progresso = (float(campanha.arrecadado) / float(campanha.meta_doacoes)) * 100
-            campanha.progresso = min(100, progresso)
-        else:
-            campanha.progresso = 0
+        campanha.progresso = campanha.progresso_meta or 0
 
-    todas_campanhas = Campanha.query.filter_by(status='ativa').all()
-    localizacoes_unicas = sorted(list(set([c.localizacao for c in todas_campanhas if c.localizacao])))
+    localizacoes_unicas = obter_localizacoes_ativas()
     
     campanhas_pendentes_count = 0
     if current_user.is_authenticated and current_user.tipo == 'moderador':
@@ -788,25 +981,28 @@ def campanhas():
     
     usuario_logado = current_user if current_user.is_authenticated else None
     
-    total_encontradas = len(campanhas_ativas)
-    
     return render_template('campanhas.html', 
                          usuario=usuario_logado, 
                          campanhas=campanhas_ativas,
+                         cursor=cursor,
+                         proximo_cursor=proximo_cursor,
+                         por_pagina=por_pagina,
                          campanhas_pendentes_count=campanhas_pendentes_count,
                          termo_busca=termo_busca,
                          localizacao_filtro=localizacao_filtro,
                          ordenacao=ordenacao,
                          localizacoes_unicas=localizacoes_unicas,
-                         total_encontradas=total_encontradas)
+                         total_encontradas=total_encontradas,
+                         total_limitado=total_limitado)
 
 @app.route('/detalhes_campanha/<int:campanha_id>')
+@somente_leitura
 @login_required
 def detalhes_campanha(campanha_id):
     campanha = Campanha.query.get_or_404(campanha_id)
     
     campanha.num_voluntarios = len(campanha.voluntarios)
-    campanha.progresso = min(100, (float(campanha.arrecadado) / float(campanha.meta_doacoes)) * 100) if campanha.meta_doacoes > 0 else 0
+    campanha.progresso = campanha.progresso_meta or 0
     
     dias_restantes = None
     if campanha.data_fim:
@@ -851,20 +1047,23 @@ def doar_campanha_pix(campanha_id):
     valor = request.form.get('valor_pix')
     
     try:
-        valor_doado = float(valor)
-        if valor_doado <= 0:
+        valor_doado = Decimal(valor).quantize(Decimal('0.01'))
+        if not valor_doado.is_finite() or valor_doado <= 0:
             raise ValueError
-    except (ValueError, TypeError):
+    except (InvalidOperation, ValueError, TypeError):
         flash('Valor de doação inválido.', 'error')
         return redirect(url_for('campanhas'))
 
-    campanha.arrecadado = float(campanha.arrecadado) + valor_doado
+    # Incremento feito pelo próprio banco: com vários workers, ler o valor e
+    # gravar a soma perderia doações simultâneas na mesma campanha
+    campanha.arrecadado = db.func.coalesce(Campanha.arrecadado, 0) + valor_doado
     db.session.commit()
 
     flash(f'Sua doação de R${valor_doado:.2f} para a campanha "{campanha.titulo}" foi registrada!', 'success')
     return redirect(url_for('campanhas'))
 
 @app.route('/moderacao')
+@somente_leitura
 @login_required
 def moderacao():
     """Painel principal de moderação"""
@@ -872,33 +1071,118 @@ def moderacao():
         flash('Acesso negado. Apenas moderadores podem acessar esta página.', 'error')
         return redirect(url_for('home'))
 
-    recebimentos_pendentes = SolicitacaoRecebimento.query.filter_by(status='pendente').all()
-    campanhas_pendentes = Campanha.query.filter_by(status='pendente').all()
-
-    campanhas_ativas = Campanha.query.filter_by(status='ativa').order_by(Campanha.data_criacao.desc()).all()
-    
-    instituicoes_pendentes = Usuario.query.filter_by(tipo='instituicao', status_aprovacao='pendente').all()
-    instituicoes = Usuario.query.filter_by(tipo='instituicao', status_aprovacao='aprovada').all()
-    
-    
-    denuncias_pendentes = DenunciaVoluntario.query.filter_by(status='pendente').order_by(DenunciaVoluntario.data_denuncia.desc()).all()
-    
-    
-    logs_recentes = LogAcaoModerador.query.order_by(LogAcaoModerador.data_acao.desc()).limit(50).all()
-    
-    now = datetime.utcnow()
-
     return render_template('moderacao.html',
-                           recebimentos_pendentes=recebimentos_pendentes,
-                           campanhas_pendentes=campanhas_pendentes,
-                           campanhas_ativas=campanhas_ativas,
-                           instituicoes_pendentes=instituicoes_pendentes,
-                           instituicoes=instituicoes,
-                           denuncias_pendentes=denuncias_pendentes,
-                           logs_recentes=logs_recentes,
-                           now=now,
+                           contagens=contar_pendencias_moderacao(),
                            usuario=current_user)
 
+@app.route('/moderacao/secao/<secao>')
+@somente_leitura
+@login_required
+def moderacao_secao(secao):
+    """Conteúdo de uma aba do painel de moderação, carregado sob demanda e paginado"""
+    if current_user.tipo != 'moderador':
+        return 'Acesso negado.', 403
+
+    if secao == 'dashboard':
+        return render_template('moderacao_secao_dashboard.html',
+                               contagens=contar_pendencias_moderacao(),
+                               estatisticas=obter_estatisticas_moderacao())
+
+    if secao not in SECOES_PAGINADAS:
+        return 'Seção não encontrada.', 404
+
+    cursor = request.args.get('cursor')
+    itens, proximo_cursor = carregar_secao_moderacao(
+        secao, cursor=cursor, tamanho=app.config['MODERACAO_ITENS_POR_PAGINA']
+    )
+
+    instituicoes = listar_instituicoes_aprovadas() if secao in ('ajuda', 'campanhas') else []
+
+    return render_template(f'moderacao_secao_{secao}.html',
+                           itens=itens,
+                           proximo_cursor=proximo_cursor,
+                           primeira_pagina=not cursor,
+                           instituicoes=instituicoes)
+
+@app.route('/moderacao/estatisticas')
+@somente_leitura
+@login_required
+def moderacao_estatisticas():
+    """Estatísticas das ações de moderação em JSON"""
+    if current_user.tipo != 'moderador':
+        return {'erro': 'Acesso negado.'}, 403
+
+    return obter_estatisticas_moderacao()
+
+@app.route('/moderacao/metricas/senhas')
+@login_required
+def moderacao_metricas_senhas():
+    """Fila, rejeições e tempos do pool de hash de senhas em JSON"""
+    if current_user.tipo != 'moderador':
+        return {'erro': 'Acesso negado.'}, 403
+
+    return metricas_pool_senhas()
+
+@app.route('/moderacao/emails')
+@login_required
+def moderacao_emails():
+    """Situação da fila de emails e emails que esgotaram as tentativas, em JSON"""
+    if current_user.tipo != 'moderador':
+        return {'erro': 'Acesso negado.'}, 403
+
+    return {
+        'fila': metricas_fila_emails(),
+        'falhas': [email.to_dict() for email in listar_falhas(request.args.get('limite', 100, type=int))],
+    }
+
+@app.route('/moderacao/emails/<int:email_id>/reenviar', methods=['POST'])
+@login_required
+def moderacao_reenviar_email(email_id):
+    """Devolve para a fila um email que esgotou as tentativas"""
+    if current_user.tipo != 'moderador':
+        return {'erro': 'Acesso negado.'}, 403
+
+    if not reenfileirar(email_id):
+        return {'erro': 'Email não encontrado entre as falhas.'}, 404
+    registrar_log('reenviou_email', 'email', email_id, None)
+    db.session.commit()
+    return {'sucesso': True}
+
+@app.route('/moderacao/exportar/<nome>.<formato>')
+@somente_leitura
+@login_required
+def moderacao_exportar(nome, formato):
+    """Exporta logs, solicitações ou doações em CSV/JSONL, com filtros por data (inicio/fim), status e instituicao_id"""
+    if current_user.tipo != 'moderador':
+        return {'erro': 'Acesso negado.'}, 403
+    if nome not in EXPORTACOES or formato not in FORMATOS:
+        return {'erro': 'Exportação não encontrada.'}, 404
+
+    try:
+        inicio = request.args.get('inicio')
+        inicio = datetime.strptime(inicio, '%Y-%m-%d') if inicio else None
+        fim = request.args.get('fim')
+        # A data final é inclusiva: vai até o fim do dia
+        fim = datetime.strptime(fim, '%Y-%m-%d') + timedelta(days=1) if fim else None
+    except ValueError:
+        return {'erro': 'Datas devem estar no formato AAAA-MM-DD.'}, 400
+    status = request.args.get('status') or None
+    instituicao_id = request.args.get('instituicao_id', type=int)
+
+    indisponiveis = filtros_indisponiveis(nome, status=status, instituicao_id=instituicao_id)
+    if indisponiveis:
+        return {'erro': f"Filtro(s) não disponível(is) para esta exportação: {', '.join(indisponiveis)}."}, 400
+
+    registrar_log(f'exportou_{nome}', 'exportacao', 0, f'{nome}.{formato}',
+                  json.dumps(request.args.to_dict(), ensure_ascii=False))
+    db.session.commit()
+
+    conteudo = gerar_exportacao(nome, formato, inicio=inicio, fim=fim, status=status,
+                                instituicao_id=instituicao_id, tamanho_lote=app.config['EXPORTACAO_LOTE'])
+    arquivo = f"{nome}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(stream_with_context(conteudo), mimetype=FORMATOS[formato],
+                    headers={'Content-Disposition': f'attachment; filename={arquivo}'})
+
 @app.route('/moderacao/editar_campanha/<int:campanha_id>', methods=['GET', 'POST'])
 @login_required
 def editar_campanha_moderacao(campanha_id):
@@ -908,7 +1192,7 @@ def editar_campanha_moderacao(campanha_id):
         return redirect(url_for('home'))
     
     campanha = Campanha.query.get_or_404(campanha_id)
-    instituicoes = Usuario.query.filter_by(tipo='instituicao', status_aprovacao='aprovada').all()
+    instituicoes = listar_instituicoes_aprovadas()
     
     if request.method == 'POST':
         titulo = request.form.get('titulo')
@@ -967,8 +1251,6 @@ def editar_campanha_moderacao(campanha_id):
                     flash('Formato de imagem não suportado. Use JPG, PNG ou GIF.', 'warning')
         
         try:
-            db.session.commit()
-
             registrar_log(
                 acao='editou_campanha',
                 tipo_item='campanha',
@@ -976,6 +1258,9 @@ def editar_campanha_moderacao(campanha_id):
                 item_nome=titulo,
                 detalhes=f'Campanha editada - Status: {status}, Meta: R${meta_doacoes:.2f}'
             )
+
+            db.session.commit()
+            invalidar_localizacoes()
             
             flash(f'Campanha "{titulo}" editada com sucesso!', 'success')
             return redirect(url_for('moderacao'))
@@ -1003,11 +1288,7 @@ def apagar_campanha(campanha_id):
     titulo_campanha = campanha.titulo
     
     try:
-        VoluntarioCampanha.query.filter_by(campanha_id=campanha.id).delete()
-        
-        DoacaoCampanha.query.filter_by(campanha_id=campanha.id).delete()
-        
-        DenunciaVoluntario.query.filter_by(campanha_id=campanha.id).delete()
+        apagar_dependencias_campanha(campanha.id)
         
         registrar_log(
             acao='apagou_campanha',
@@ -1019,6 +1300,7 @@ def apagar_campanha(campanha_id):
 
         db.session.delete(campanha)
         db.session.commit()
+        invalidar_localizacoes()
         
         flash(f'Campanha "{titulo_campanha}" foi apagada permanentemente.', 'success')
         
@@ -1049,8 +1331,6 @@ def suspender_campanha(campanha_id):
         acao_log = 'suspendeu_campanha'
     
     try:
-        db.session.commit()
-
         registrar_log(
             acao=acao_log,
             tipo_item='campanha',
@@ -1058,6 +1338,10 @@ def suspender_campanha(campanha_id):
             item_nome=campanha.titulo,
             detalhes=f'Status alterado para: {campanha.status}'
         )
+        notificar_status_campanha(campanha)
+
+        db.session.commit()
+        invalidar_localizacoes()
         
         flash(mensagem, 'success')
         
@@ -1089,8 +1373,6 @@ def rejeitar_solicitacao(tipo, id):
     
     if solicitacao:
         solicitacao.status = 'rejeitada'
-        db.session.commit()
-
         registrar_log(
             acao=f'rejeitou_{tipo}',
             tipo_item=tipo,
@@ -1098,6 +1380,9 @@ def rejeitar_solicitacao(tipo, id):
             item_nome=item_nome,
             detalhes=f'Solicitação de {tipo} rejeitada'
         )
+        db.session.commit()
+        if tipo == 'campanha':
+            invalidar_localizacoes()
         
         flash(f'Solicitação de {tipo} rejeitada com sucesso.', 'warning')
     else:
@@ -1121,7 +1406,6 @@ def aprovar_campanha(campanha_id):
 
     campanha.status = 'pendente'  # Fica pendente até a instituição aceitar
     campanha.instituicao_id = int(instituicao_id)
-    db.session.commit()
 
     instituicao = Usuario.query.get(instituicao_id)
     registrar_log(
@@ -1131,6 +1415,8 @@ def aprovar_campanha(campanha_id):
         item_nome=campanha.titulo,
         detalhes=f'Campanha delegada para {instituicao.instituicao_nome if instituicao else "instituição desconhecida"} (ID: {instituicao_id}) - Aguardando aceitação'
     )
+    db.session.commit()
+    invalidar_localizacoes()
     
     flash(f'Campanha "{campanha.titulo}" foi delegada para {instituicao.instituicao_nome}. Aguardando aceitação da instituição.', 'success')
     return redirect(url_for('moderacao'))
@@ -1149,8 +1435,6 @@ def aprovar_instituicao(instituicao_id):
         return redirect(url_for('moderacao'))
     
     instituicao.status_aprovacao = 'aprovada'
-    db.session.commit()
-
     registrar_log(
         acao='aprovou_instituicao',
         tipo_item='instituicao',
@@ -1158,6 +1442,7 @@ def aprovar_instituicao(instituicao_id):
         item_nome=instituicao.instituicao_nome,
         detalhes=f'Instituição {instituicao.instituicao_tipo} aprovada - Email: {instituicao.email}'
     )
+    db.session.commit()
     
     flash(f'Instituição "{instituicao.instituicao_nome}" aprovada com sucesso!', 'success')
     return redirect(url_for('moderacao'))
@@ -1175,8 +1460,6 @@ def rejeitar_instituicao(instituicao_id):
         return redirect(url_for('moderacao'))
     
     instituicao.status_aprovacao = 'rejeitada'
-    db.session.commit()
-
     registrar_log(
         acao='rejeitou_instituicao',
         tipo_item='instituicao',
@@ -1184,6 +1467,7 @@ def rejeitar_instituicao(instituicao_id):
         item_nome=instituicao.instituicao_nome,
         detalhes=f'Instituição {instituicao.instituicao_tipo} rejeitada - Email: {instituicao.email}'
     )
+    db.session.commit()
     
     flash(f'Instituição "{instituicao.instituicao_nome}" rejeitada.', 'warning')
     return redirect(url_for('moderacao'))
@@ -1287,6 +1571,14 @@ def delegar_solicitacao(tipo, solicitacao_id):
             return redirect(url_for('moderacao'))
 
         db.session.add(nova_delegacao)
+        registrar_log(
+            acao=f'delegou_{tipo}',
+            tipo_item=tipo,
+            item_id=solicitacao_id,
+            item_nome=item_nome,
+            detalhes=f'Solicitação delegada para {instituicao.instituicao_nome} (ID: {instituicao_id})'
+        )
+        notificar_delegacao_nova(instituicao, tipo, item_nome)
         db.session.commit()
         
         print(f"✅ Delegação criada com sucesso!")
@@ -1294,23 +1586,7 @@ def delegar_solicitacao(tipo, solicitacao_id):
         print(f"   Moderador ID: {nova_delegacao.moderador_id}")
         print(f"   Instituição ID: {nova_delegacao.instituicao_id}")
         print(f"   Status: {nova_delegacao.status}")
-
-        delegacao_verificacao = Delegacao.query.get(nova_delegacao.id)
-        if delegacao_verificacao:
-            print(f"✅ Verificação: Delegação foi salva corretamente no banco!")
-            print(f"   Instituição da delegação: {delegacao_verificacao.instituicao_id}")
-        else:
-            print(f"❌ ERRO: Delegação não foi encontrada após commit!")
-        
         print(f"{'='*70}\n")
-
-        registrar_log(
-            acao=f'delegou_{tipo}',
-            tipo_item=tipo,
-            item_id=solicitacao_id,
-            item_nome=item_nome,
-            detalhes=f'Solicitação delegada para {instituicao.instituicao_nome} (ID: {instituicao_id})'
-        )
         
         flash(f'✅ Solicitação de {tipo} delegada com sucesso para {instituicao.instituicao_nome}!', 'success')
         
@@ -1331,7 +1607,7 @@ def criar_campanha():
         flash('Acesso negado. Apenas moderadores podem criar campanhas.', 'error')
         return redirect(url_for('campanhas'))
     
-    instituicoes = Usuario.query.filter_by(tipo='instituicao', status_aprovacao='aprovada').all()
+    instituicoes = listar_instituicoes_aprovadas()
     
     if request.method == 'POST':
         titulo = request.form.get('titulo')
@@ -1368,7 +1644,7 @@ def criar_campanha():
             instituicao_id=int(instituicao_id) if instituicao_id and instituicao_id != '' else None
         )
         db.session.add(nova_campanha)
-        db.session.commit()
+        db.session.flush()
 
         registrar_log(
             acao='criou_campanha',
@@ -1377,6 +1653,8 @@ def criar_campanha():
             item_nome=titulo,
             detalhes=f'Campanha criada com status "{status}" - Meta: R${meta_doacoes:.2f}'
         )
+        db.session.commit()
+        invalidar_localizacoes()
         
         flash(f'Campanha "{titulo}" criada com sucesso!', 'success')
         return redirect(url_for('campanhas'))
@@ -1392,8 +1670,6 @@ def aprovar_recebimento(id):
         
     solicitacao = SolicitacaoRecebimento.query.get_or_404(id)
     solicitacao.status = 'aprovada'
-    db.session.commit()
-
     registrar_log(
         acao='aprovou_recebimento',
         tipo_item='recebimento',
@@ -1401,6 +1677,7 @@ def aprovar_recebimento(id):
         item_nome=solicitacao.nome,
         detalhes=f'Solicitação de {solicitacao.qtd_pessoas} pessoas aprovada - {solicitacao.qtd_cestas} cestas solicitadas'
     )
+    db.session.commit()
     
     flash(f'Solicitação de ajuda de "{solicitacao.nome}" aprovada com sucesso!', 'success')
     return redirect(url_for('moderacao'))
@@ -1487,8 +1764,6 @@ def analisar_denuncia(denuncia_id):
         flash('Denúncia arquivada sem ação.', 'info')
     
     try:
-        db.session.commit()
-
         registrar_log(
             acao='analisou_denuncia',
             tipo_item='denuncia',
@@ -1496,6 +1771,7 @@ def analisar_denuncia(denuncia_id):
             item_nome=f'{denuncia.denunciante.nome} → {denuncia.denunciado.nome}',
             detalhes=f'Ação tomada: {acao} - Motivo: {denuncia.motivo}'
         )
+        db.session.commit()
         
     except Exception as e:
         db.session.rollback()
@@ -1516,8 +1792,6 @@ def arquivar_denuncia(denuncia_id):
     denuncia.data_resolucao = datetime.utcnow()
     
     try:
-        db.session.commit()
-
         registrar_log(
             acao='arquivou_denuncia',
             tipo_item='denuncia',
@@ -1525,6 +1799,7 @@ def arquivar_denuncia(denuncia_id):
             item_nome=f'{denuncia.denunciante.nome} → {denuncia.denunciado.nome}',
             detalhes=f'Denúncia arquivada - Motivo original: {denuncia.motivo}'
         )
+        db.session.commit()
         
         flash('Denúncia arquivada com sucesso.', 'success')
     except Exception as e:
@@ -1552,9 +1827,9 @@ def solicitacoes_instituicao():
     
     print(f"\n📊 Total de delegações encontradas: {len(todas_delegacoes)}")
 
-    campanhas_delegadas = Campanha.query.filter_by(
-        instituicao_id=current_user.id
-    ).all()
+    campanhas_delegadas = listar_com_num_voluntarios(
+        Campanha.query.filter_by(instituicao_id=current_user.id)
+    )
     
     print(f"📊 Total de campanhas delegadas: {len(campanhas_delegadas)}")
 
@@ -1823,10 +2098,12 @@ def aceitar_delegacao(delegacao_id):
         solicitacao = SolicitacaoDoacao.query.get(delegacao.solicitacao_doacao_id)
         if solicitacao:
             solicitacao.status = 'aceita'
+        notificar_status_delegacao(delegacao, solicitacao, 'doacao')
     elif delegacao.solicitacao_recebimento_id:
         solicitacao = SolicitacaoRecebimento.query.get(delegacao.solicitacao_recebimento_id)
         if solicitacao:
             solicitacao.status = 'aceita'
+        notificar_status_delegacao(delegacao, solicitacao, 'recebimento')
     
     try:
         db.session.commit()
@@ -1855,6 +2132,7 @@ def aceitar_campanha(campanha_id):
     
     try:
         db.session.commit()
+        invalidar_localizacoes()
         flash(f'Campanha "{campanha.titulo}" aceita e ativada com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1880,6 +2158,7 @@ def recusar_campanha(campanha_id):
     
     try:
         db.session.commit()
+        invalidar_localizacoes()
         flash(f'Campanha "{campanha.titulo}" recusada. Ela retornou para o painel de moderação.', 'warning')
     except Exception as e:
         db.session.rollback()
@@ -1906,10 +2185,12 @@ def recusar_delegacao(delegacao_id):
         solicitacao = SolicitacaoDoacao.query.get(delegacao.solicitacao_doacao_id)
         if solicitacao:
             solicitacao.status = 'pendente'
+        notificar_status_delegacao(delegacao, solicitacao, 'doacao')
     elif delegacao.solicitacao_recebimento_id:
         solicitacao = SolicitacaoRecebimento.query.get(delegacao.solicitacao_recebimento_id)
         if solicitacao:
             solicitacao.status = 'pendente'
+        notificar_status_delegacao(delegacao, solicitacao, 'recebimento')
 
     try:
         db.session.commit()
@@ -1946,6 +2227,7 @@ def reportar_entrega(delegacao_id):
             recebimento.data_entrega_final = datetime.utcnow()
             recebimento.status = 'entregue'
             delegacao.status = 'concluida'
+            notificar_status_delegacao(delegacao, recebimento, 'recebimento')
             
             try:
                 db.session.commit()
@@ -2012,39 +2294,66 @@ def doar_itens_campanha(campanha_id):
     flash(f'Sua doação de {total_itens} item(ns) foi registrada com sucesso!', 'success')
     return redirect(url_for('detalhes_campanha', campanha_id=campanha_id))
 
+def apagar_dependencias_campanha(campanha_id):
+    denuncias_ids = db.select(DenunciaVoluntario.id).where(DenunciaVoluntario.campanha_id == campanha_id)
+    Advertencia.query.filter(Advertencia.denuncia_id.in_(denuncias_ids)).update(
+        {'denuncia_id': None}, synchronize_session=False
+    )
+
+    VoluntarioCampanha.query.filter_by(campanha_id=campanha_id).delete()
+    DoacaoCampanha.query.filter_by(campanha_id=campanha_id).delete()
+    DenunciaVoluntario.query.filter_by(campanha_id=campanha_id).delete()
+
 def apagar_cascata_usuario(user: Usuario):
+    # A ordem importa: com foreign_keys=ON as linhas dependentes precisam sair antes
+    doacoes_ids = db.select(SolicitacaoDoacao.id).where(SolicitacaoDoacao.usuario_id == user.id)
+    recebimentos_ids = db.select(SolicitacaoRecebimento.id).where(SolicitacaoRecebimento.usuario_id == user.id)
+
     VoluntarioCampanha.query.filter_by(usuario_id=user.id).delete()
 
+    Delegacao.query.filter(
+        or_(
+            Delegacao.instituicao_id == user.id,
+            Delegacao.moderador_id == user.id,
+            Delegacao.solicitacao_doacao_id.in_(doacoes_ids),
+            Delegacao.solicitacao_recebimento_id.in_(recebimentos_ids)
+        )
+    ).delete(synchronize_session=False)
+
+    # Doações de outros usuários para os recebimentos apagados perdem apenas o vínculo
+    SolicitacaoDoacao.query.filter(
+        SolicitacaoDoacao.solicitacao_recebimento_id.in_(recebimentos_ids)
+    ).update({'solicitacao_recebimento_id': None}, synchronize_session=False)
+
     SolicitacaoDoacao.query.filter_by(usuario_id=user.id).delete()
 
     DoacaoCampanha.query.filter_by(usuario_id=user.id).delete()
 
     SolicitacaoRecebimento.query.filter_by(usuario_id=user.id).delete()
 
-    Delegacao.query.filter(
-        or_(Delegacao.instituicao_id == user.id, Delegacao.moderador_id == user.id)
-    ).delete()
+    Advertencia.query.filter(
+        or_(Advertencia.usuario_id == user.id, Advertencia.moderador_id == user.id)
+    ).delete(synchronize_session=False)
 
-    DenunciaVoluntario.query.filter(
-        or_(
-            DenunciaVoluntario.denunciante_id == user.id,
-            DenunciaVoluntario.denunciado_id == user.id,
-            DenunciaVoluntario.moderador_id == user.id
-        )
-    ).delete()
+    denuncias_usuario = or_(
+        DenunciaVoluntario.denunciante_id == user.id,
+        DenunciaVoluntario.denunciado_id == user.id,
+        DenunciaVoluntario.moderador_id == user.id
+    )
+    Advertencia.query.filter(
+        Advertencia.denuncia_id.in_(db.select(DenunciaVoluntario.id).where(denuncias_usuario))
+    ).update({'denuncia_id': None}, synchronize_session=False)
+
+    DenunciaVoluntario.query.filter(denuncias_usuario).delete(synchronize_session=False)
 
     campanhas_solicitadas = Campanha.query.filter_by(solicitante_id=user.id).all()
     for c in campanhas_solicitadas:
-        VoluntarioCampanha.query.filter_by(campanha_id=c.id).delete()
-        DoacaoCampanha.query.filter_by(campanha_id=c.id).delete()
-        DenunciaVoluntario.query.filter_by(campanha_id=c.id).delete()
+        apagar_dependencias_campanha(c.id)
         db.session.delete(c)
 
     campanhas_delegadas = Campanha.query.filter_by(instituicao_id=user.id).all()
     for c in campanhas_delegadas:
-        VoluntarioCampanha.query.filter_by(campanha_id=c.id).delete()
-        DoacaoCampanha.query.filter_by(campanha_id=c.id).delete()
-        DenunciaVoluntario.query.filter_by(campanha_id=c.id).delete()
+        apagar_dependencias_campanha(c.id)
         db.session.delete(c)
 
     LogAcaoModerador.query.filter_by(moderador_id=user.id).delete()
@@ -2059,7 +2368,7 @@ def moderacao_usuarios():
     termo = request.args.get('q', '').strip()
     tipo = request.args.get('tipo', '').strip()
 
-    query = Usuario.query
+    query = resumo_usuarios(Usuario.query)
     if termo:
         like = f"%{termo}%"
         query = query.filter(
@@ -2091,7 +2400,12 @@ def revogar_minha_conta():
             flash('Por favor, confirme sua senha.', 'error')
             return redirect(url_for('revogar_minha_conta'))
         
-        if current_user.senha != hash_password(senha_confirmacao):
+        try:
+            senha_correta = verificar_senha_no_pool(senha_confirmacao, current_user.senha)
+        except ServicoSaturado:
+            return resposta_servico_saturado('revogar_conta.html', usuario=current_user)
+
+        if not senha_correta:
             flash('Senha incorreta.', 'error')
             return redirect(url_for('revogar_minha_conta'))
         
@@ -2101,15 +2415,14 @@ def revogar_minha_conta():
                 flash('Código 2FA obrigatório.', 'error')
                 return redirect(url_for('revogar_minha_conta'))
             
-            totp = pyotp.TOTP(current_user.two_factor_secret)
-            if not totp.verify(codigo_2fa):
+            if not verificar_codigo_totp(current_user.id, current_user.two_factor_secret, codigo_2fa):
                 flash('Código 2FA inválido.', 'error')
                 return redirect(url_for('revogar_minha_conta'))
 
         try:
             # Se necessário, remova dependências do usuário aqui (doações, solicitações, etc.)
             # Exemplo: apagar_cascata_usuario(current_user)
-            db.session.delete(current_user)
+            db.session.delete(current_user.usuario)
             db.session.commit()
             logout_user()
             flash('Sua conta foi removida do sistema com sucesso.', 'success')
@@ -2140,8 +2453,6 @@ def excluir_usuario(user_id):
     try:
         apagar_cascata_usuario(user)
         db.session.delete(user)
-        db.session.commit()
-
         registrar_log(
             acao=f'apagou_{tipo_item}',
             tipo_item=tipo_item,
@@ -2149,6 +2460,8 @@ def excluir_usuario(user_id):
             item_nome=nome_item,
             detalhes=f'{tipo_item.capitalize()} excluído(a) definitivamente'
         )
+        db.session.commit()
+        invalidar_localizacoes()
 
         flash(f'{tipo_item.capitalize()} "{nome_item}" excluído(a) com sucesso.', 'success')
     except Exception as e:
@@ -2218,7 +2531,6 @@ def remover_voluntario(campanha_id, voluntario_id):
     
     try:
         db.session.delete(voluntario)
-        db.session.commit()
         
         # Registrar log se for moderador
         if current_user.tipo == 'moderador':
@@ -2229,6 +2541,7 @@ def remover_voluntario(campanha_id, voluntario_id):
                 item_nome=campanha.titulo,
                 detalhes=f'Voluntário {nome_voluntario} (ID: {voluntario_id}) removido da campanha'
             )
+        db.session.commit()
         
         flash(f'Voluntário {nome_voluntario} foi removido da campanha com sucesso.', 'success')
         
@@ -2252,9 +2565,71 @@ def marcar_advertencia_vista(advertencia_id):
     flash('Advertência marcada como lida.', 'success')
     return redirect(url_for('perfil'))
 
+@app.cli.command('migrar')
+@click.option('--alvo', type=int, default=None, help='Versão final (padrão: a mais recente).')
+@click.option('--simular', is_flag=True, help='Mostra os comandos sem executá-los.')
+def migrar_comando(alvo, simular):
+    """Aplica as migrações de esquema pendentes."""
+    db.create_all()
+    migrar(alvo=alvo, simular=simular)
+
+@app.cli.command('reverter-migracao')
+@click.option('--alvo', type=int, required=True, help='Versão em que o esquema deve ficar.')
+@click.option('--simular', is_flag=True, help='Mostra os comandos sem executá-los.')
+def reverter_migracao_comando(alvo, simular):
+    """Desfaz as migrações aplicadas acima da versão alvo."""
+    reverter(alvo, simular=simular)
+
+@app.cli.command('versao-esquema')
+def versao_esquema_comando():
+    """Mostra a versão de esquema aplicada e a mais recente disponível."""
+    print(f"Versão aplicada: {versao_atual()} / mais recente: {versao_mais_recente()}")
+
+@app.cli.command('manutencao-sqlite')
+def manutencao_sqlite_comando():
+    """Faz checkpoint do WAL e atualiza as estatísticas do SQLite."""
+    if db.engine.dialect.name != 'sqlite':
+        print("O banco configurado não é SQLite.")
+        return
+    print(f"Checkpoint (ocupado, páginas no WAL, transferidas): {executar_manutencao(db.engine)}")
+
+@app.cli.command('arquivar-logs')
+@click.option('--meses', type=int, default=None, help='Meses mantidos no log (padrão: LOGS_RETENCAO_MESES).')
+def arquivar_logs_comando(meses):
+    """Move os logs de moderação antigos para as tabelas de arquivo mensais."""
+    meses = app.config['LOGS_RETENCAO_MESES'] if meses is None else meses
+    arquivados = arquivar_logs(meses)
+    if not arquivados:
+        print(f"Nenhum log anterior aos últimos {meses} meses para arquivar.")
+    for periodo, movidos in arquivados:
+        print(f"{periodo}: {movidos} logs arquivados.")
+
+@app.cli.command('enviar-emails')
+def enviar_emails_comando():
+    """Envia agora todos os emails vencidos da fila."""
+    total_enviados = total_falhas = 0
+    while True:
+        reservados, enviados, falhas = processar_fila()
+        total_enviados += enviados
+        total_falhas += falhas
+        if reservados < app.config['EMAIL_LOTE']:
+            break
+    print(f"{total_enviados} emails enviados, {total_falhas} falhas.")
+    print(f"Fila: {metricas_fila_emails()}")
+
+@app.cli.command('reindexar-busca')
+def reindexar_busca():
+    """Recria do zero o índice de busca textual das campanhas."""
+    if not criar_indice_busca():
+        print("Índice de busca indisponível neste banco de dados.")
+        return
+    total = reconstruir_indice_busca()
+    print(f"Índice de busca reconstruído: {total} campanhas indexadas.")
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        migrar()
         create_initial_data()
         
     app.run(host='0.0.0.0', port=5000, debug=True)
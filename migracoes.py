@@ -0,0 +1,311 @@
+"""
+Migrações versionadas do esquema do banco de dados.
+
+db.create_all() só cria tabelas que ainda não existem; índices, colunas e
+tabelas auxiliares adicionados depois precisam chegar aos bancos já em uso
+por aqui. Cada migração tem uma versão, uma descrição e listas de passos para
+subir e descer. A versão aplicada fica registrada na tabela schema_version.
+
+Um passo é um comando SQL (str) ou uma função que recebe o dialeto e devolve
+o comando, para DDL que depende do banco (índices dos modelos, por exemplo),
+ou None quando não há nada a fazer (coluna que já existe, por exemplo).
+Todos os passos devem ser idempotentes (IF [NOT] EXISTS), pois um banco novo
+já recebe pelo create_all boa parte do que as migrações criam.
+
+Migrações marcadas com 'transacional': False rodam cada passo em sua própria
+transação curta (e com CREATE INDEX CONCURRENTLY no PostgreSQL), para não
+segurar o lock de escrita durante toda a migração.
+"""
+from datetime import datetime
+from sqlalchemy import text, inspect, update
+from sqlalchemy.schema import CreateIndex, DropIndex, CreateColumn, CreateTable, DropTable
+from db import db
+from models import categoria_da_acao_expr, CATEGORIA_OUTRA
+import busca
+
+_DDL_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        versao INTEGER PRIMARY KEY,
+        descricao VARCHAR(200) NOT NULL,
+        aplicada_em TIMESTAMP NOT NULL
+    )
+"""
+
+def _indices_modelos():
+    indices = {}
+    for tabela in db.metadata.tables.values():
+        for indice in tabela.indexes:
+            indices[indice.name] = indice
+    return indices
+
+def criar_indice(nome):
+    """Passo que cria o índice declarado nos modelos com o nome informado."""
+    def passo(dialeto):
+        indice = _indices_modelos()[nome]
+        sql = str(CreateIndex(indice, if_not_exists=True).compile(dialect=dialeto))
+        if dialeto.name == 'postgresql':
+            sql = sql.replace('INDEX IF NOT EXISTS', 'INDEX CONCURRENTLY IF NOT EXISTS', 1)
+        return sql
+    passo.__doc__ = f'criar índice {nome}'
+    return passo
+
+def remover_indice(nome):
+    """Passo que remove o índice com o nome informado."""
+    def passo(dialeto):
+        indice = _indices_modelos()[nome]
+        return str(DropIndex(indice, if_exists=True).compile(dialect=dialeto))
+    passo.__doc__ = f'remover índice {nome}'
+    return passo
+
+def criar_tabela(nome):
+    """Passo que cria a tabela declarada nos modelos com o nome informado (sem os índices)."""
+    def passo(dialeto):
+        tabela = db.metadata.tables[nome]
+        return str(CreateTable(tabela, if_not_exists=True).compile(dialect=dialeto))
+    passo.__doc__ = f'criar tabela {nome}'
+    return passo
+
+def remover_tabela(nome):
+    """Passo que remove a tabela com o nome informado."""
+    def passo(dialeto):
+        tabela = db.metadata.tables[nome]
+        return str(DropTable(tabela, if_exists=True).compile(dialect=dialeto))
+    passo.__doc__ = f'remover tabela {nome}'
+    return passo
+
+def _coluna_existe(tabela, coluna):
+    return coluna in {c['name'] for c in inspect(db.engine).get_columns(tabela)}
+
+def adicionar_coluna(tabela, coluna):
+    """Passo que adiciona a coluna declarada nos modelos, se ela ainda não existir."""
+    def passo(dialeto):
+        if _coluna_existe(tabela, coluna):
+            return None
+        definicao = CreateColumn(db.metadata.tables[tabela].c[coluna]).compile(dialect=dialeto)
+        return f'ALTER TABLE {tabela} ADD COLUMN {definicao}'
+    passo.__doc__ = f'adicionar coluna {tabela}.{coluna}'
+    return passo
+
+def remover_coluna(tabela, coluna):
+    """Passo que remove a coluna, se ela existir."""
+    def passo(dialeto):
+        if not _coluna_existe(tabela, coluna):
+            return None
+        return f'ALTER TABLE {tabela} DROP COLUMN {coluna}'
+    passo.__doc__ = f'remover coluna {tabela}.{coluna}'
+    return passo
+
+def _preencher_categoria_logs(dialeto):
+    logs = db.metadata.tables['log_acoes_moderador']
+    comando = update(logs).values(categoria=categoria_da_acao_expr(logs.c.acao)).where(
+        logs.c.categoria == CATEGORIA_OUTRA
+    )
+    return str(comando.compile(dialect=dialeto, compile_kwargs={'literal_binds': True}))
+
+_INDICES_ROTAS_QUENTES = [
+    'ix_usuarios_tipo_status_aprovacao',
+    'ix_usuarios_cpf',
+    'ix_usuarios_data_criacao',
+    'ix_campanhas_status_data_criacao',
+    'ix_campanhas_status_titulo',
+    'ix_campanhas_solicitante_status',
+    'ix_campanhas_solicitante_data_criacao',
+    'ix_campanhas_instituicao_status',
+    'ix_campanhas_status_progresso',
+    'uq_voluntarios_usuario_campanha',
+    'ix_voluntarios_campanha',
+    'ix_solicitacoes_doacao_usuario_data_criacao',
+    'ix_solicitacoes_doacao_recebimento',
+    'ix_solicitacoes_doacao_status_data_criacao',
+    'ix_solicitacoes_recebimento_status_data_criacao',
+    'ix_solicitacoes_recebimento_usuario_data_criacao',
+    'ix_delegacoes_instituicao_status',
+    'ix_delegacoes_moderador',
+    'ix_delegacoes_doacao',
+    'ix_delegacoes_recebimento',
+    'ix_doacoes_campanha_campanha_data',
+    'ix_doacoes_campanha_usuario',
+    'ix_denuncias_status_data',
+    'ix_denuncias_denunciante_data',
+    'ix_denuncias_denunciado_data',
+    'ix_denuncias_campanha',
+    'ix_denuncias_moderador',
+    'ix_log_acoes_data_acao',
+    'ix_log_acoes_moderador_data_acao',
+    'ix_log_acoes_tipo_item_data_acao',
+    'ix_advertencias_usuario_vista_data',
+    'ix_advertencias_moderador',
+]
+
+MIGRACOES = [
+    {
+        'versao': 1,
+        'descricao': 'Índices compostos das rotas mais acessadas',
+        'transacional': False,
+        'subir': [
+            # Inscrições duplicadas impediriam o índice único (usuario_id, campanha_id)
+            """
+            DELETE FROM voluntarios_campanhas WHERE id NOT IN (
+                SELECT MIN(id) FROM voluntarios_campanhas GROUP BY usuario_id, campanha_id
+            )
+            """,
+        ] + [criar_indice(nome) for nome in _INDICES_ROTAS_QUENTES],
+        'descer': [remover_indice(nome) for nome in reversed(_INDICES_ROTAS_QUENTES)],
+    },
+    {
+        'versao': 2,
+        'descricao': 'Índice de busca textual das campanhas (FTS5)',
+        'dialetos': ['sqlite'],
+        'subir': busca.DDL_INDICE_BUSCA + [
+            "INSERT INTO campanhas_fts(campanhas_fts) VALUES ('rebuild')",
+        ],
+        'descer': busca.DDL_REMOVER_INDICE_BUSCA,
+    },
+    {
+        'versao': 3,
+        'descricao': 'Categoria normalizada das ações do log de moderação',
+        'subir': [
+            adicionar_coluna('log_acoes_moderador', 'categoria'),
+            _preencher_categoria_logs,
+            criar_indice('ix_log_acoes_moderador_categoria'),
+        ],
+        'descer': [
+            remover_indice('ix_log_acoes_moderador_categoria'),
+            remover_coluna('log_acoes_moderador', 'categoria'),
+        ],
+    },
+    {
+        'versao': 4,
+        'descricao': 'Índice e resumo dos arquivos mensais do log de moderação',
+        'subir': [
+            criar_tabela('arquivos_log_moderacao'),
+            criar_tabela('resumo_arquivos_log_moderacao'),
+            criar_indice('ix_resumo_arquivos_log_moderador_periodo'),
+            criar_indice('ix_resumo_arquivos_log_tipo_item_periodo'),
+        ],
+        # As tabelas mensais log_acoes_moderador_AAAAMM não são removidas
+        'descer': [
+            remover_tabela('resumo_arquivos_log_moderacao'),
+            remover_tabela('arquivos_log_moderacao'),
+        ],
+    },
+    {
+        'versao': 5,
+        'descricao': 'Fila persistente de emails de saída',
+        'subir': [
+            criar_tabela('fila_emails'),
+            criar_indice('ix_fila_emails_status_proxima'),
+        ],
+        'descer': [
+            remover_tabela('fila_emails'),
+        ],
+    },
+]
+
+def versao_atual():
+    """
+    Obtém a versão de esquema aplicada ao banco.
+
+    Returns:
+        int: Maior versão registrada em schema_version, ou 0 se nenhuma
+    """
+    with db.engine.begin() as conexao:
+        conexao.execute(text(_DDL_SCHEMA_VERSION))
+        versao = conexao.execute(text("SELECT MAX(versao) FROM schema_version")).scalar()
+    return versao or 0
+
+def versao_mais_recente():
+    """Versão da última migração conhecida pelo código."""
+    return max(m['versao'] for m in MIGRACOES) if MIGRACOES else 0
+
+def migrar(alvo=None, simular=False):
+    """
+    Aplica as migrações pendentes até a versão alvo.
+
+    Args:
+        alvo (int, optional): Versão final desejada; por padrão, a mais recente
+        simular (bool): Se True, apenas mostra os comandos que seriam executados
+
+    Returns:
+        list: Versões aplicadas (ou que seriam aplicadas, na simulação)
+    """
+    atual = versao_atual()
+    alvo = versao_mais_recente() if alvo is None else alvo
+
+    pendentes = [m for m in sorted(MIGRACOES, key=lambda m: m['versao'])
+                 if atual < m['versao'] <= alvo]
+
+    if not pendentes:
+        print(f"Esquema já está na versão {atual}.")
+        return []
+
+    for migracao in pendentes:
+        _executar(migracao, migracao['subir'], simular)
+        if not simular:
+            with db.engine.begin() as conexao:
+                conexao.execute(text(
+                    "INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (:v, :d, :a)"
+                ), {'v': migracao['versao'], 'd': migracao['descricao'], 'a': datetime.utcnow()})
+        print(f"{'[simulação] ' if simular else ''}Migração {migracao['versao']} aplicada: {migracao['descricao']}")
+
+    return [m['versao'] for m in pendentes]
+
+def reverter(alvo, simular=False):
+    """
+    Desfaz as migrações aplicadas acima da versão alvo, da mais nova para a mais antiga.
+
+    Args:
+        alvo (int): Versão em que o esquema deve ficar
+        simular (bool): Se True, apenas mostra os comandos que seriam executados
+
+    Returns:
+        list: Versões revertidas (ou que seriam revertidas, na simulação)
+    """
+    atual = versao_atual()
+
+    aplicadas = [m for m in sorted(MIGRACOES, key=lambda m: m['versao'], reverse=True)
+                 if alvo < m['versao'] <= atual]
+
+    if not aplicadas:
+        print(f"Nada a reverter: esquema na versão {atual}.")
+        return []
+
+    for migracao in aplicadas:
+        _executar(migracao, migracao['descer'], simular)
+        if not simular:
+            with db.engine.begin() as conexao:
+                conexao.execute(text("DELETE FROM schema_version WHERE versao = :v"),
+                                {'v': migracao['versao']})
+        print(f"{'[simulação] ' if simular else ''}Migração {migracao['versao']} revertida: {migracao['descricao']}")
+
+    return [m['versao'] for m in aplicadas]
+
+def _executar(migracao, passos, simular):
+    dialeto = db.engine.dialect
+
+    if dialeto.name not in migracao.get('dialetos', [dialeto.name]):
+        print(f"Migração {migracao['versao']} não se aplica ao banco {dialeto.name}; apenas registrada.")
+        return
+
+    # Passos que dependem do estado do banco devolvem None quando não há nada a fazer
+    comandos = [passo(dialeto) if callable(passo) else passo for passo in passos]
+    comandos = [comando for comando in comandos if comando]
+
+    if simular:
+        for comando in comandos:
+            print(f"[simulação] v{migracao['versao']}: {' '.join(comando.split())}")
+        return
+
+    if migracao.get('transacional', True):
+        with db.engine.begin() as conexao:
+            for comando in comandos:
+                conexao.execute(text(comando))
+        return
+
+    for comando in comandos:
+        if dialeto.name == 'postgresql':
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+                conexao.execute(text(comando))
+        else:
+            with db.engine.begin() as conexao:
+                conexao.execute(text(comando))
@@ -1,9 +1,15 @@
 from db import db
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy.sql.expression import Grouping
 
 class Usuario(UserMixin, db.Model):
     __tablename__ = 'usuarios'
+    __table_args__ = (
+        db.Index('ix_usuarios_tipo_status_aprovacao', 'tipo', 'status_aprovacao'),
+        db.Index('ix_usuarios_cpf', 'cpf'),
+        db.Index('ix_usuarios_data_criacao', 'data_criacao'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -13,19 +19,22 @@ class Usuario(UserMixin, db.Model):
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Campos longos ou raramente lidos ficam em grupos adiados (db.deferred): não
+    # vêm nas consultas de Usuario nem nos joins dos relacionamentos, e o primeiro
+    # acesso a um deles carrega o grupo inteiro em uma consulta.
     cpf = db.Column(db.String(14))
     cidade = db.Column(db.String(100))
-    endereco = db.Column(db.String(255))
+    endereco = db.deferred(db.Column(db.String(255)), group='perfil')
     telefone = db.Column(db.String(20))
-    bio = db.Column(db.Text)
+    bio = db.deferred(db.Column(db.Text), group='perfil')
     foto_perfil = db.Column(db.String(255))
     instituicao_nome = db.Column(db.String(200))
-    instituicao_endereco = db.Column(db.String(255))
+    instituicao_endereco = db.deferred(db.Column(db.String(255)), group='perfil')
     instituicao_cep = db.Column(db.String(10))
     instituicao_tipo = db.Column(db.String(20))
     instituicao_cnpj = db.Column(db.String(18))
     status_aprovacao = db.Column(db.String(20), default='pendente')
-    two_factor_secret = db.Column(db.String(32))
+    two_factor_secret = db.deferred(db.Column(db.String(32)), group='seguranca')
     two_factor_enabled = db.Column(db.Boolean, default=False)
     gov_br_id = db.Column(db.String(255), unique=True, nullable=True)
     gov_br_linked = db.Column(db.Boolean, default=False)
@@ -34,11 +43,35 @@ class Usuario(UserMixin, db.Model):
     
     # Campos para revogação de conta
     conta_revogada = db.Column(db.Boolean, default=False, nullable=False)
-    data_revogacao = db.Column(db.DateTime, nullable=True)
-    motivo_revogacao = db.Column(db.Text, nullable=True)
+    data_revogacao = db.deferred(db.Column(db.DateTime, nullable=True), group='revogacao')
+    motivo_revogacao = db.deferred(db.Column(db.Text, nullable=True), group='revogacao')
+
+def progresso_meta_expr(arrecadado, meta_doacoes):
+    """Percentual (0 a 100) da meta de doações já arrecadado, calculado no banco.
+
+    As constantes são literais (e não parâmetros) para que a expressão gerada nas
+    consultas seja idêntica à do índice ix_campanhas_status_progresso.
+    """
+    arrecadado = db.type_coerce(arrecadado, db.Float)
+    meta_doacoes = db.type_coerce(meta_doacoes, db.Float)
+    zero = db.literal_column('0', db.Float)
+    cem = db.literal_column('100', db.Float)
+
+    return db.case(
+        (db.func.coalesce(meta_doacoes, zero) <= zero, zero),
+        (arrecadado >= meta_doacoes, cem),
+        else_=db.func.coalesce(arrecadado, zero) * db.literal_column('100.0', db.Float) / meta_doacoes
+    )
 
 class Campanha(db.Model):
     __tablename__ = 'campanhas'
+    __table_args__ = (
+        db.Index('ix_campanhas_status_data_criacao', 'status', 'data_criacao'),
+        db.Index('ix_campanhas_status_titulo', 'status', 'titulo'),
+        db.Index('ix_campanhas_solicitante_status', 'solicitante_id', 'status'),
+        db.Index('ix_campanhas_solicitante_data_criacao', 'solicitante_id', 'data_criacao'),
+        db.Index('ix_campanhas_instituicao_status', 'instituicao_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
@@ -58,8 +91,21 @@ class Campanha(db.Model):
     instituicao_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
     instituicao_delegada = db.relationship('Usuario', foreign_keys=[instituicao_id], backref=db.backref('campanhas_delegadas', lazy=True))
 
+    progresso_meta = db.column_property(progresso_meta_expr(arrecadado, meta_doacoes))
+
+# Entre parênteses: o PostgreSQL só aceita expressões (como o CASE) no índice assim
+db.Index(
+    'ix_campanhas_status_progresso',
+    Campanha.__table__.c.status,
+    Grouping(progresso_meta_expr(Campanha.__table__.c.arrecadado, Campanha.__table__.c.meta_doacoes))
+)
+
 class VoluntarioCampanha(db.Model):
     __tablename__ = 'voluntarios_campanhas'
+    __table_args__ = (
+        db.Index('uq_voluntarios_usuario_campanha', 'usuario_id', 'campanha_id', unique=True),
+        db.Index('ix_voluntarios_campanha', 'campanha_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -71,6 +117,11 @@ class VoluntarioCampanha(db.Model):
 
 class SolicitacaoDoacao(db.Model):
     __tablename__ = 'solicitacoes_doacao'
+    __table_args__ = (
+        db.Index('ix_solicitacoes_doacao_usuario_data_criacao', 'usuario_id', 'data_criacao'),
+        db.Index('ix_solicitacoes_doacao_recebimento', 'solicitacao_recebimento_id'),
+        db.Index('ix_solicitacoes_doacao_status_data_criacao', 'status', 'data_criacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -90,6 +141,10 @@ class SolicitacaoDoacao(db.Model):
 
 class SolicitacaoRecebimento(db.Model):
     __tablename__ = 'solicitacoes_recebimento'
+    __table_args__ = (
+        db.Index('ix_solicitacoes_recebimento_status_data_criacao', 'status', 'data_criacao'),
+        db.Index('ix_solicitacoes_recebimento_usuario_data_criacao', 'usuario_id', 'data_criacao'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -119,6 +174,12 @@ class SolicitacaoRecebimento(db.Model):
 
 class Delegacao(db.Model):
     __tablename__ = 'delegacoes'
+    __table_args__ = (
+        db.Index('ix_delegacoes_instituicao_status', 'instituicao_id', 'status'),
+        db.Index('ix_delegacoes_moderador', 'moderador_id'),
+        db.Index('ix_delegacoes_doacao', 'solicitacao_doacao_id'),
+        db.Index('ix_delegacoes_recebimento', 'solicitacao_recebimento_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     moderador_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -135,6 +196,10 @@ class Delegacao(db.Model):
 
 class DoacaoCampanha(db.Model):
     __tablename__ = 'doacoes_campanha'
+    __table_args__ = (
+        db.Index('ix_doacoes_campanha_campanha_data', 'campanha_id', 'data_doacao'),
+        db.Index('ix_doacoes_campanha_usuario', 'usuario_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campanha_id = db.Column(db.Integer, db.ForeignKey('campanhas.id'), nullable=False)
@@ -151,6 +216,13 @@ class DoacaoCampanha(db.Model):
 
 class DenunciaVoluntario(db.Model):
     __tablename__ = 'denuncias_voluntarios'
+    __table_args__ = (
+        db.Index('ix_denuncias_status_data', 'status', 'data_denuncia'),
+        db.Index('ix_denuncias_denunciante_data', 'denunciante_id', 'data_denuncia'),
+        db.Index('ix_denuncias_denunciado_data', 'denunciado_id', 'data_denuncia'),
+        db.Index('ix_denuncias_campanha', 'campanha_id'),
+        db.Index('ix_denuncias_moderador', 'moderador_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     denunciante_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -170,12 +242,44 @@ class DenunciaVoluntario(db.Model):
     campanha = db.relationship('Campanha', backref=db.backref('denuncias', lazy=True))
     moderador = db.relationship('Usuario', foreign_keys=[moderador_id], backref=db.backref('denuncias_analisadas', lazy=True))
 
+# Categoria de cada ação do log, pelo verbo no início de 'acao' (ex: 'aprovou_campanha')
+CATEGORIAS_ACAO = {
+    'aprovou': 'aprovacao',
+    'rejeitou': 'rejeicao',
+    'delegou': 'delegacao',
+}
+CATEGORIA_OUTRA = 'outra'
+
+def categoria_da_acao(acao):
+    """Categoria normalizada de uma ação do log (ver CATEGORIAS_ACAO)."""
+    for prefixo, categoria in CATEGORIAS_ACAO.items():
+        if (acao or '').startswith(prefixo):
+            return categoria
+    return CATEGORIA_OUTRA
+
+def categoria_da_acao_expr(acao):
+    """Mesma regra de categoria_da_acao como expressão SQL, para preencher registros antigos."""
+    return db.case(
+        *[(acao.like(f'{prefixo}%'), db.literal(categoria)) for prefixo, categoria in CATEGORIAS_ACAO.items()],
+        else_=db.literal(CATEGORIA_OUTRA)
+    )
+
+def _categoria_padrao(contexto):
+    return categoria_da_acao(contexto.get_current_parameters().get('acao'))
+
 class LogAcaoModerador(db.Model):
     __tablename__ = 'log_acoes_moderador'
+    __table_args__ = (
+        db.Index('ix_log_acoes_data_acao', 'data_acao'),
+        db.Index('ix_log_acoes_moderador_data_acao', 'moderador_id', 'data_acao'),
+        db.Index('ix_log_acoes_tipo_item_data_acao', 'tipo_item', 'data_acao'),
+        db.Index('ix_log_acoes_moderador_categoria', 'moderador_id', 'categoria'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     moderador_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     acao = db.Column(db.String(100), nullable=False)
+    categoria = db.Column(db.String(20), nullable=False, default=_categoria_padrao, server_default=CATEGORIA_OUTRA)
     tipo_item = db.Column(db.String(50), nullable=False)
     item_id = db.Column(db.Integer, nullable=False)
     item_nome = db.Column(db.String(200), nullable=True)
@@ -185,9 +289,71 @@ class LogAcaoModerador(db.Model):
     
     moderador = db.relationship('Usuario', backref=db.backref('acoes_log', lazy=True))
 
+# Índice dos arquivos mensais do log de moderação (ver arquivo_logs.py)
+class ArquivoLogModeracao(db.Model):
+    __tablename__ = 'arquivos_log_moderacao'
+
+    periodo = db.Column(db.String(7), primary_key=True)  # 'AAAA-MM'
+    tabela = db.Column(db.String(64), nullable=False, unique=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    inicio = db.Column(db.DateTime, nullable=True)
+    fim = db.Column(db.DateTime, nullable=True)
+    arquivado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+# Contagens de cada arquivo mensal, para as estatísticas e para saber em quais meses procurar
+class ResumoArquivoLogModeracao(db.Model):
+    __tablename__ = 'resumo_arquivos_log_moderacao'
+    __table_args__ = (
+        db.Index('ix_resumo_arquivos_log_moderador_periodo', 'moderador_id', 'periodo'),
+        db.Index('ix_resumo_arquivos_log_tipo_item_periodo', 'tipo_item', 'periodo'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.String(7), db.ForeignKey('arquivos_log_moderacao.periodo'), nullable=False)
+    moderador_id = db.Column(db.Integer, nullable=False)
+    acao = db.Column(db.String(100), nullable=False)
+    categoria = db.Column(db.String(20), nullable=False)
+    tipo_item = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+
+# Fila persistente de emails de saída (ver fila_emails.py)
+class EmailFila(db.Model):
+    __tablename__ = 'fila_emails'
+    __table_args__ = (
+        db.Index('ix_fila_emails_status_proxima', 'status', 'proxima_tentativa'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(120), nullable=False)
+    assunto = db.Column(db.String(200), nullable=False)
+    corpo_html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'enviado', 'falhou'
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reservado_por = db.Column(db.String(32), nullable=True)
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enviado_em = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'destinatario': self.destinatario,
+            'assunto': self.assunto,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'ultimo_erro': self.ultimo_erro,
+            'criado_em': self.criado_em.strftime('%d/%m/%Y %H:%M') if self.criado_em else None,
+            'proxima_tentativa': self.proxima_tentativa.strftime('%d/%m/%Y %H:%M') if self.proxima_tentativa else None,
+        }
+
 # NOVO MODELO: Advertência
 class Advertencia(db.Model):
     __tablename__ = 'advertencias'
+    __table_args__ = (
+        db.Index('ix_advertencias_usuario_vista_data', 'usuario_id', 'vista', 'data_acao'),
+        db.Index('ix_advertencias_moderador', 'moderador_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
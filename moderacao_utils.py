@@ -0,0 +1,162 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload, load_only
+from models import Usuario, Campanha, SolicitacaoRecebimento, DenunciaVoluntario, LogAcaoModerador
+from db import db
+from paginacao import paginar_keyset
+from campanha_utils import com_num_voluntarios, anexar_num_voluntarios
+
+_cache_total_logs = {'valor': None, 'expira_em': 0.0}
+_lock = threading.Lock()
+
+def contar_logs_moderacao():
+    """
+    Conta as ações no log de moderação, mantendo o total em cache por ESTATISTICAS_TTL segundos.
+
+    O log só cresce e a contagem percorre a tabela inteira; o total da aba de
+    logs não precisa ser exato a cada carregamento do painel.
+
+    Returns:
+        int: Quantidade de registros no log (sem os meses arquivados)
+    """
+    agora = time.monotonic()
+    with _lock:
+        if _cache_total_logs['valor'] is not None and agora < _cache_total_logs['expira_em']:
+            return _cache_total_logs['valor']
+
+    total = db.session.execute(select(func.count(LogAcaoModerador.id))).scalar()
+
+    with _lock:
+        _cache_total_logs['valor'] = total
+        _cache_total_logs['expira_em'] = agora + current_app.config.get('ESTATISTICAS_TTL', 60)
+    return total
+
+def contar_pendencias_moderacao():
+    """
+    Conta os itens de cada aba do painel de moderação em uma única consulta.
+
+    Cada contagem é uma subconsulta escalar atendida pelo índice do respectivo
+    filtro, e todas vão ao banco juntas em um só SELECT. O total de logs vem
+    de contar_logs_moderacao, em cache.
+
+    Returns:
+        dict: recebimentos_pendentes, campanhas_pendentes, campanhas_ativas,
+              instituicoes_pendentes, denuncias_pendentes e total_logs
+    """
+    def contar(modelo, *filtros):
+        return select(func.count(modelo.id)).where(*filtros).scalar_subquery()
+
+    consulta = select(
+        contar(SolicitacaoRecebimento, SolicitacaoRecebimento.status == 'pendente').label('recebimentos_pendentes'),
+        contar(Campanha, Campanha.status == 'pendente').label('campanhas_pendentes'),
+        contar(Campanha, Campanha.status == 'ativa').label('campanhas_ativas'),
+        contar(Usuario, Usuario.tipo == 'instituicao',
+               Usuario.status_aprovacao == 'pendente').label('instituicoes_pendentes'),
+        contar(DenunciaVoluntario, DenunciaVoluntario.status == 'pendente').label('denuncias_pendentes'),
+    )
+
+    try:
+        contagens = dict(db.session.execute(consulta).mappings().one())
+        contagens['total_logs'] = contar_logs_moderacao()
+        return contagens
+    except Exception as e:
+        print(f"Erro ao contar pendências da moderação: {e}")
+        return dict.fromkeys(['recebimentos_pendentes', 'campanhas_pendentes', 'campanhas_ativas',
+                              'instituicoes_pendentes', 'denuncias_pendentes', 'total_logs'], 0)
+
+# Colunas das listagens de usuários (ex: moderacao_usuarios)
+RESUMO_USUARIO = (Usuario.id, Usuario.nome, Usuario.email, Usuario.tipo, Usuario.instituicao_nome,
+                  Usuario.status_aprovacao, Usuario.data_criacao)
+
+def resumo_usuarios(query):
+    """
+    Restringe uma consulta de Usuario às colunas de RESUMO_USUARIO.
+
+    Args:
+        query: Consulta de Usuario
+
+    Returns:
+        Query: A mesma consulta, carregando só as colunas do resumo
+    """
+    return query.options(load_only(*RESUMO_USUARIO))
+
+def listar_instituicoes_aprovadas():
+    """
+    Lista as instituições aprovadas para os seletores de delegação, carregando só id e nome.
+
+    Returns:
+        list: Lista de objetos Usuario
+    """
+    return Usuario.query.options(
+        load_only(Usuario.id, Usuario.nome, Usuario.instituicao_nome)
+    ).filter_by(
+        tipo='instituicao', status_aprovacao='aprovada'
+    ).order_by(Usuario.instituicao_nome.asc()).all()
+
+def _por_data(coluna_data, coluna_id):
+    ordenacao = [(coluna_data, 'desc'), (coluna_id, 'desc')]
+    return ordenacao, lambda item: (getattr(item, coluna_data.key), getattr(item, coluna_id.key))
+
+def _secao_ajuda(cursor, tamanho):
+    ordenacao, chave = _por_data(SolicitacaoRecebimento.data_criacao, SolicitacaoRecebimento.id)
+    query = SolicitacaoRecebimento.query.filter_by(status='pendente')
+    return paginar_keyset(query, 'moderacao_ajuda', ordenacao, chave, cursor=cursor, tamanho=tamanho)
+
+def _secao_campanhas(cursor, tamanho):
+    ordenacao, chave = _por_data(Campanha.data_criacao, Campanha.id)
+    query = Campanha.query.options(joinedload(Campanha.solicitante)).filter_by(status='pendente')
+    return paginar_keyset(query, 'moderacao_campanhas', ordenacao, chave, cursor=cursor, tamanho=tamanho)
+
+def _secao_campanhas_ativas(cursor, tamanho):
+    query, _ = com_num_voluntarios(
+        Campanha.query.options(joinedload(Campanha.instituicao_delegada)).filter_by(status='ativa')
+    )
+    ordenacao = [(Campanha.data_criacao, 'desc'), (Campanha.id, 'desc')]
+    linhas, proximo_cursor = paginar_keyset(query, 'moderacao_campanhas_ativas', ordenacao,
+                                            lambda linha: (linha[0].data_criacao, linha[0].id),
+                                            cursor=cursor, tamanho=tamanho)
+    return anexar_num_voluntarios(linhas), proximo_cursor
+
+def _secao_instituicoes(cursor, tamanho):
+    ordenacao, chave = _por_data(Usuario.data_criacao, Usuario.id)
+    query = Usuario.query.filter_by(tipo='instituicao', status_aprovacao='pendente')
+    return paginar_keyset(query, 'moderacao_instituicoes', ordenacao, chave, cursor=cursor, tamanho=tamanho)
+
+def _secao_denuncias(cursor, tamanho):
+    ordenacao, chave = _por_data(DenunciaVoluntario.data_denuncia, DenunciaVoluntario.id)
+    query = DenunciaVoluntario.query.options(
+        joinedload(DenunciaVoluntario.denunciante),
+        joinedload(DenunciaVoluntario.denunciado),
+        joinedload(DenunciaVoluntario.campanha)
+    ).filter_by(status='pendente')
+    return paginar_keyset(query, 'moderacao_denuncias', ordenacao, chave, cursor=cursor, tamanho=tamanho)
+
+def _secao_logs(cursor, tamanho):
+    ordenacao, chave = _por_data(LogAcaoModerador.data_acao, LogAcaoModerador.id)
+    query = LogAcaoModerador.query.options(joinedload(LogAcaoModerador.moderador))
+    return paginar_keyset(query, 'moderacao_logs', ordenacao, chave, cursor=cursor, tamanho=tamanho)
+
+SECOES_PAGINADAS = {
+    'ajuda': _secao_ajuda,
+    'campanhas': _secao_campanhas,
+    'campanhas_ativas': _secao_campanhas_ativas,
+    'instituicoes': _secao_instituicoes,
+    'denuncias': _secao_denuncias,
+    'logs': _secao_logs,
+}
+
+def carregar_secao_moderacao(secao, cursor=None, tamanho=20):
+    """
+    Carrega uma página de itens de uma aba do painel de moderação.
+
+    Args:
+        secao (str): Nome da aba (chave de SECOES_PAGINADAS)
+        cursor (str, optional): Token da página anterior
+        tamanho (int): Quantidade de itens por página
+
+    Returns:
+        tuple: (itens da página, token da próxima página ou None)
+    """
+    return SECOES_PAGINADAS[secao](cursor, tamanho)
@@ -0,0 +1,254 @@
+"""
+Notificações por email para muitos destinatários.
+
+Cada notificação de NOTIFICACOES tem um template de email e um assunto. O
+template é renderizado uma única vez por notificação, locale e contexto
+comum (título da campanha, por exemplo): os campos de cada destinatário
+({{ destinatario.nome }}, {{ destinatario.email }}, {{ destinatario.link }}...)
+saem como marcadores, e o HTML é quebrado em partes fixas e campos. Para cada
+destinatário resta só juntar as partes com os valores escapados, sem passar
+pelo Jinja de novo. Os templates compilados ficam em cache (os
+NOTIFICACOES_CACHE_MAXIMO mais recentes).
+
+Por isso os campos do destinatário devem aparecer no template sem filtros
+(um |upper, por exemplo, alteraria o marcador).
+
+Para o locale, vale o template email_<nome>.<locale>.html, se existir, e
+senão email_<nome>.html.
+
+notificar coloca os emails na fila de saída (fila_emails.py) em lotes de
+INSERT, na transação de quem chamou: se a ação que gerou a notificação for
+desfeita, os emails também são.
+"""
+import string
+import threading
+from collections import OrderedDict
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from sqlalchemy import or_
+from db import db
+from fila_emails import enfileirar_varios
+from models import EmailFila, Usuario, VoluntarioCampanha
+
+NOTIFICACOES = {
+    'campanha_status': {
+        'template': 'campanha_status',
+        'assunto': 'Campanha "{campanha_titulo}" {status_texto}',
+    },
+    'delegacao_nova': {
+        'template': 'delegacao_nova',
+        'assunto': 'Nova solicitação de {tipo_texto} delegada - SOS Comida',
+    },
+    'delegacao_status': {
+        'template': 'delegacao_status',
+        'assunto': 'Sua solicitação de {tipo_texto} foi {status_texto} - SOS Comida',
+    },
+    'redefinir_senha': {
+        'template': 'redefinir_senha',
+        'assunto': 'Redefinição de Senha - SOS Comida',
+    },
+}
+
+# Texto do status nos assuntos e no corpo dos emails
+STATUS_CAMPANHA = {
+    'ativa': 'foi reativada',
+    'suspensa': 'foi suspensa',
+}
+
+STATUS_DELEGACAO = {
+    'aceita': 'aceita',
+    'recusada': 'devolvida para a moderação',
+    'concluida': 'concluída',
+}
+
+TIPOS_SOLICITACAO = {
+    'doacao': 'doação',
+    'recebimento': 'recebimento',
+}
+
+# Separa os marcadores do resto do HTML; não aparece em texto renderizado pelo Jinja
+_SEPARADOR = '\x00'
+
+_compiladas = OrderedDict()
+_lock = threading.Lock()
+
+class _Marcadores:
+    """Destinatário fictício: cada atributo lido vira um marcador no HTML."""
+
+    def __getattr__(self, campo):
+        return Markup(f'{_SEPARADOR}{campo}{_SEPARADOR}')
+
+def _formatar_assunto(modelo, contexto):
+    # O contexto vem de dados dos usuários (título da campanha): quebras de linha no assunto
+    # tornariam o cabeçalho inválido, então todo espaço em branco vira um espaço simples
+    campos = {campo for _, campo, _, _ in string.Formatter().parse(modelo) if campo}
+    valores = {campo: ' '.join(str(contexto[campo]).split()) for campo in campos}
+    assunto = ' '.join(modelo.format(**valores).split())
+
+    # O assunto precisa caber na coluna da fila: o valor mais longo é encurtado, e o resto
+    # do assunto (o status, por exemplo) é mantido
+    maximo = EmailFila.__table__.c.assunto.type.length
+    if len(assunto) > maximo and valores:
+        campo = max(valores, key=lambda c: len(valores[c]))
+        tamanho = max(0, len(valores[campo]) - (len(assunto) - maximo) - 1)
+        valores[campo] = valores[campo][:tamanho].rstrip() + '…'
+        assunto = ' '.join(modelo.format(**valores).split())
+    return assunto[:maximo]
+
+def _chave(nome, locale, contexto):
+    return nome, locale, tuple(sorted((chave, str(valor)) for chave, valor in contexto.items()))
+
+def compilar_notificacao(nome, locale=None, **contexto):
+    """
+    Renderiza o template da notificação com o contexto comum e o quebra em partes.
+
+    Args:
+        nome (str): Chave de NOTIFICACOES
+        locale (str, optional): Locale do template (padrão: NOTIFICACOES_LOCALE)
+        **contexto: Valores comuns a todos os destinatários
+
+    Returns:
+        tuple: (assunto, partes), com as partes alternando texto fixo e nome de campo
+    """
+    locale = locale or current_app.config.get('NOTIFICACOES_LOCALE', 'pt_BR')
+    chave = _chave(nome, locale, contexto)
+    with _lock:
+        compilada = _compiladas.get(chave)
+        if compilada is not None:
+            _compiladas.move_to_end(chave)
+            return compilada
+
+    definicao = NOTIFICACOES[nome]
+    template = current_app.jinja_env.get_or_select_template([
+        f"email_{definicao['template']}.{locale}.html",
+        f"email_{definicao['template']}.html",
+    ])
+    html = template.render(destinatario=_Marcadores(), **contexto)
+    assunto = _formatar_assunto(definicao['assunto'], contexto)
+    compilada = (assunto, html.split(_SEPARADOR))
+
+    with _lock:
+        _compiladas[chave] = compilada
+        while len(_compiladas) > current_app.config.get('NOTIFICACOES_CACHE_MAXIMO', 128):
+            _compiladas.popitem(last=False)
+    return compilada
+
+def _valor(destinatario, campo):
+    if isinstance(destinatario, dict):
+        return destinatario.get(campo, '')
+    return getattr(destinatario, campo, '')
+
+def _preencher(partes, destinatario):
+    # Partes pares são texto fixo; ímpares, campos do destinatário
+    return ''.join(parte if i % 2 == 0 else str(escape(_valor(destinatario, parte) or ''))
+                   for i, parte in enumerate(partes))
+
+def notificar(nome, destinatarios, locale=None, **contexto):
+    """
+    Coloca na fila de emails uma notificação para cada destinatário.
+
+    Args:
+        nome (str): Chave de NOTIFICACOES
+        destinatarios (iterable): Objetos (Usuario, linhas de consulta) ou dicionários
+            com email e os demais campos usados pelo template
+        locale (str, optional): Locale do template (padrão: NOTIFICACOES_LOCALE)
+        **contexto: Valores comuns a todos os destinatários
+
+    Returns:
+        int: Quantidade de emails enfileirados
+    """
+    assunto, partes = compilar_notificacao(nome, locale, **contexto)
+    lote = current_app.config.get('NOTIFICACOES_LOTE_INSERCAO', 500)
+    total = 0
+    emails = []
+    for destinatario in destinatarios:
+        email = _valor(destinatario, 'email')
+        if not email:
+            continue
+        emails.append({'destinatario': email, 'assunto': assunto, 'corpo_html': _preencher(partes, destinatario)})
+        if len(emails) >= lote:
+            total += enfileirar_varios(emails)
+            emails = []
+    return total + enfileirar_varios(emails)
+
+def voluntarios_da_campanha(campanha_id):
+    """
+    Nome e email dos voluntários ativos de uma campanha, lidos aos poucos.
+
+    Args:
+        campanha_id (int): ID da campanha
+
+    Returns:
+        Query: Linhas com nome e email
+    """
+    return (db.session.query(Usuario.nome, Usuario.email)
+            .join(VoluntarioCampanha, VoluntarioCampanha.usuario_id == Usuario.id)
+            .filter(VoluntarioCampanha.campanha_id == campanha_id,
+                    or_(Usuario.conta_revogada.is_(False), Usuario.conta_revogada.is_(None)))
+            .order_by(Usuario.id)
+            .yield_per(current_app.config.get('NOTIFICACOES_LOTE_INSERCAO', 500)))
+
+def notificar_status_campanha(campanha):
+    """
+    Avisa os voluntários de uma campanha que ela foi suspensa ou reativada.
+
+    Args:
+        campanha (Campanha): Campanha com o status já alterado
+
+    Returns:
+        int: Quantidade de emails enfileirados (0 para status sem aviso)
+    """
+    if campanha.status not in STATUS_CAMPANHA:
+        return 0
+    return notificar(
+        'campanha_status',
+        voluntarios_da_campanha(campanha.id),
+        campanha_titulo=campanha.titulo,
+        status=campanha.status,
+        status_texto=STATUS_CAMPANHA[campanha.status],
+        link=url_for('detalhes_campanha', campanha_id=campanha.id, _external=True),
+    )
+
+def notificar_delegacao_nova(instituicao, tipo, item_nome):
+    """
+    Avisa a instituição que recebeu uma solicitação delegada pela moderação.
+
+    Args:
+        instituicao (Usuario): Instituição que recebeu a delegação
+        tipo (str): 'doacao' ou 'recebimento'
+        item_nome (str): Nome do doador ou do solicitante
+
+    Returns:
+        int: Quantidade de emails enfileirados
+    """
+    return notificar(
+        'delegacao_nova',
+        [{'email': instituicao.email, 'nome': instituicao.instituicao_nome or instituicao.nome, 'item_nome': item_nome}],
+        tipo_texto=TIPOS_SOLICITACAO[tipo],
+        link=url_for('solicitacoes_instituicao', _external=True),
+    )
+
+def notificar_status_delegacao(delegacao, solicitacao, tipo):
+    """
+    Avisa o autor da solicitação que a instituição aceitou, devolveu ou concluiu a delegação.
+
+    Args:
+        delegacao (Delegacao): Delegação com o status já alterado
+        solicitacao (SolicitacaoDoacao ou SolicitacaoRecebimento): Solicitação delegada
+        tipo (str): 'doacao' ou 'recebimento'
+
+    Returns:
+        int: Quantidade de emails enfileirados (0 para status sem aviso)
+    """
+    if delegacao.status not in STATUS_DELEGACAO or solicitacao is None or solicitacao.usuario is None:
+        return 0
+    instituicao = delegacao.instituicao
+    return notificar(
+        'delegacao_status',
+        [solicitacao.usuario],
+        tipo_texto=TIPOS_SOLICITACAO[tipo],
+        status=delegacao.status,
+        status_texto=STATUS_DELEGACAO[delegacao.status],
+        instituicao_nome=(instituicao.instituicao_nome or instituicao.nome) if instituicao else '',
+        link=url_for('minhas_solicitacoes', _external=True),
+    )
@@ -0,0 +1,118 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+
+def codificar_cursor(escopo, valores):
+    """
+    Codifica os valores de ordenação da última linha de uma página em um token opaco.
+
+    Args:
+        escopo (str): Identificador da ordenação (ex: 'recentes'), impede reutilizar o token em outra ordenação
+        valores (tuple): Valores das colunas de ordenação da última linha exibida
+
+    Returns:
+        str: Token seguro para URL
+    """
+    serializados = []
+    for valor in valores:
+        if isinstance(valor, datetime):
+            serializados.append({'dt': valor.isoformat()})
+        elif isinstance(valor, Decimal):
+            serializados.append({'dec': str(valor)})
+        else:
+            serializados.append(valor)
+
+    bruto = json.dumps({'e': escopo, 'v': serializados}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+def decodificar_cursor(token, escopo, quantidade):
+    """
+    Decodifica um token gerado por codificar_cursor.
+
+    Args:
+        token (str): Token recebido na URL
+        escopo (str): Ordenação esperada para o token
+        quantidade (int): Número de colunas de ordenação esperado
+
+    Returns:
+        list: Valores de ordenação, ou None se o token for inválido
+    """
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(token + preenchimento))
+
+        if dados.get('e') != escopo or len(dados.get('v', [])) != quantidade:
+            return None
+
+        valores = []
+        for valor in dados['v']:
+            if isinstance(valor, dict) and 'dt' in valor:
+                valores.append(datetime.fromisoformat(valor['dt']))
+            elif isinstance(valor, dict) and 'dec' in valor:
+                valores.append(Decimal(valor['dec']))
+            else:
+                valores.append(valor)
+        return valores
+    except Exception as e:
+        print(f"Cursor de paginação inválido: {e}")
+        return None
+
+def filtro_keyset(ordenacao, valores):
+    """
+    Monta a condição WHERE que seleciona as linhas posteriores a um cursor.
+
+    Args:
+        ordenacao (list): Lista de tuplas (expressão, 'asc' | 'desc')
+        valores (list): Valores da última linha da página anterior
+
+    Returns:
+        Expressão SQLAlchemy equivalente a (c1, c2, ...) > (v1, v2, ...) respeitando a direção de cada coluna
+    """
+    condicoes = []
+    for i, (expressao, direcao) in enumerate(ordenacao):
+        anteriores = [expr == valor for (expr, _), valor in zip(ordenacao[:i], valores[:i])]
+        if direcao == 'asc':
+            comparacao = expressao > valores[i]
+        else:
+            comparacao = expressao < valores[i]
+        condicoes.append(and_(*anteriores, comparacao))
+    return or_(*condicoes)
+
+def paginar_keyset(query, escopo, ordenacao, chave, cursor=None, tamanho=12):
+    """
+    Pagina uma consulta por keyset (seek method), com custo constante por página.
+
+    A última expressão de ordenação deve ser única (normalmente o id) para que a
+    ordem seja total e nenhuma linha se repita ou se perca entre páginas.
+
+    Args:
+        query: Consulta SQLAlchemy já filtrada
+        escopo (str): Nome da ordenação, gravado no token
+        ordenacao (list): Lista de tuplas (expressão, 'asc' | 'desc')
+        chave (callable): Recebe uma linha do resultado e devolve a tupla de valores de ordenação
+        cursor (str, optional): Token da página anterior
+        tamanho (int): Quantidade de itens por página
+
+    Returns:
+        tuple: (itens da página, token da próxima página ou None)
+    """
+    if cursor:
+        valores = decodificar_cursor(cursor, escopo, len(ordenacao))
+        if valores is not None:
+            query = query.filter(filtro_keyset(ordenacao, valores))
+
+    query = query.order_by(*[
+        expressao.asc() if direcao == 'asc' else expressao.desc()
+        for expressao, direcao in ordenacao
+    ])
+
+    linhas = query.limit(tamanho + 1).all()
+
+    proximo_cursor = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        proximo_cursor = codificar_cursor(escopo, chave(linhas[-1]))
+
+    return linhas, proximo_cursor
@@ -0,0 +1,111 @@
+import threading
+import time
+from sqlalchemy import event, text
+
+PERFIL_PADRAO = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    'SQLITE_TEMP_STORE': 'MEMORY',
+    'SQLITE_FOREIGN_KEYS': True,
+    'SQLITE_MANUTENCAO_INTERVALO': 300,
+}
+
+def pragmas_do_perfil(config):
+    """
+    Monta a lista de PRAGMAs aplicados em cada nova conexão.
+
+    Args:
+        config (dict): Configuração da aplicação; chaves ausentes usam PERFIL_PADRAO
+
+    Returns:
+        list: Comandos PRAGMA
+    """
+    valor = lambda chave: config.get(chave, PERFIL_PADRAO[chave])
+    return [
+        f"PRAGMA journal_mode={valor('SQLITE_JOURNAL_MODE')}",
+        f"PRAGMA busy_timeout={int(valor('SQLITE_BUSY_TIMEOUT_MS'))}",
+        f"PRAGMA synchronous={valor('SQLITE_SYNCHRONOUS')}",
+        f"PRAGMA mmap_size={int(valor('SQLITE_MMAP_SIZE'))}",
+        # Valor negativo: tamanho do cache em KiB, e não em páginas
+        f"PRAGMA cache_size={-int(valor('SQLITE_CACHE_SIZE_KB'))}",
+        f"PRAGMA temp_store={valor('SQLITE_TEMP_STORE')}",
+        f"PRAGMA foreign_keys={'ON' if valor('SQLITE_FOREIGN_KEYS') else 'OFF'}",
+    ]
+
+def aplicar_perfil_sqlite(engine, config):
+    """
+    Registra os PRAGMAs do perfil de produção para todas as conexões do engine.
+
+    Com WAL os leitores não bloqueiam o escritor (e vice-versa), e o busy_timeout
+    faz um worker esperar pelo lock em vez de falhar com "database is locked".
+
+    Args:
+        engine: Engine SQLAlchemy
+        config (dict): Configuração da aplicação
+
+    Returns:
+        bool: True se o perfil foi registrado, False se o banco não é SQLite
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    pragmas = pragmas_do_perfil(config)
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao_dbapi, _registro):
+        cursor = conexao_dbapi.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return True
+
+def executar_manutencao(engine):
+    """
+    Faz um checkpoint do WAL e atualiza as estatísticas do planejador.
+
+    O checkpoint PASSIVE não espera por leitores nem escritores, então pode
+    rodar com a aplicação em uso; PRAGMA optimize só reanalisa o que mudou.
+
+    Args:
+        engine: Engine SQLAlchemy de um banco SQLite
+
+    Returns:
+        tuple: (ocupado, páginas no WAL, páginas transferidas) do wal_checkpoint
+    """
+    with engine.connect() as conexao:
+        resultado = conexao.execute(text("PRAGMA wal_checkpoint(PASSIVE)")).first()
+        conexao.execute(text("PRAGMA optimize"))
+    return tuple(resultado) if resultado else None
+
+def iniciar_manutencao_periodica(engine, config):
+    """
+    Inicia uma thread daemon que chama executar_manutencao a cada SQLITE_MANUTENCAO_INTERVALO segundos.
+
+    Args:
+        engine: Engine SQLAlchemy
+        config (dict): Configuração da aplicação
+
+    Returns:
+        threading.Thread: A thread iniciada, ou None se desativada ou o banco não for SQLite
+    """
+    intervalo = int(config.get('SQLITE_MANUTENCAO_INTERVALO', PERFIL_PADRAO['SQLITE_MANUTENCAO_INTERVALO']))
+    if engine.dialect.name != 'sqlite' or intervalo <= 0:
+        return None
+
+    def _laco():
+        while True:
+            time.sleep(intervalo)
+            try:
+                executar_manutencao(engine)
+            except Exception as e:
+                print(f"Erro na manutenção periódica do SQLite: {e}")
+
+    thread = threading.Thread(target=_laco, name='manutencao-sqlite', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,126 @@
+"""
+Pool limitado para o hash de senhas.
+
+Cada verificação de senha custa dezenas de milissegundos de CPU (ver
+senhas.py). Para que um pico de logins não tome a CPU das demais rotas, os
+hashes rodam em um pool de SENHA_WORKERS threads (o hashlib libera o GIL
+durante o cálculo), com no máximo SENHA_FILA_MAXIMA tarefas esperando. Com o
+pool cheio, ou se o resultado demorar mais que SENHA_ESPERA_MAXIMA segundos,
+a chamada levanta ServicoSaturado e a rota responde 503 na hora.
+"""
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+from flask import current_app
+from senhas import gerar_hash, verificar_senha
+
+class ServicoSaturado(Exception):
+    """O pool de hash de senhas está cheio; a requisição deve ser recusada com 503."""
+
+_lock = threading.Lock()
+_pool = {'executor': None, 'vagas': None, 'workers': 0, 'fila_maxima': 0}
+_metricas = {'aguardando': 0, 'executando': 0, 'concluidas': 0, 'recusadas': 0, 'esgotadas': 0}
+# Últimas amostras, em segundos: tempo do hash e tempo esperando na fila
+_tempos_hash = deque(maxlen=500)
+_tempos_espera = deque(maxlen=500)
+
+def _obter_pool(config):
+    with _lock:
+        if _pool['executor'] is None:
+            workers = int(config.get('SENHA_WORKERS') or os.cpu_count() or 1)
+            fila_maxima = int(config.get('SENHA_FILA_MAXIMA', 4 * workers))
+            _pool.update(
+                executor=ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash-senhas'),
+                vagas=threading.BoundedSemaphore(workers + fila_maxima),
+                workers=workers,
+                fila_maxima=fila_maxima,
+            )
+        return _pool['executor'], _pool['vagas']
+
+def executar_no_pool(funcao, *args):
+    """
+    Executa a função no pool de hash de senhas e espera o resultado.
+
+    Args:
+        funcao (callable): Função a executar (roda dentro do contexto da aplicação)
+        *args: Argumentos da função
+
+    Returns:
+        O retorno da função
+
+    Raises:
+        ServicoSaturado: Se o pool e a fila estão cheios ou a espera passou de SENHA_ESPERA_MAXIMA
+    """
+    app = current_app._get_current_object()
+    executor, vagas = _obter_pool(app.config)
+
+    if not vagas.acquire(blocking=False):
+        with _lock:
+            _metricas['recusadas'] += 1
+        raise ServicoSaturado()
+
+    enviada = time.perf_counter()
+    with _lock:
+        _metricas['aguardando'] += 1
+
+    def tarefa():
+        inicio = time.perf_counter()
+        with _lock:
+            _metricas['aguardando'] -= 1
+            _metricas['executando'] += 1
+            _tempos_espera.append(inicio - enviada)
+        try:
+            with app.app_context():
+                return funcao(*args)
+        finally:
+            with _lock:
+                _metricas['executando'] -= 1
+                _metricas['concluidas'] += 1
+                _tempos_hash.append(time.perf_counter() - inicio)
+            vagas.release()
+
+    futuro = executor.submit(tarefa)
+    try:
+        return futuro.result(timeout=app.config.get('SENHA_ESPERA_MAXIMA', 5))
+    except TempoEsgotado:
+        with _lock:
+            _metricas['esgotadas'] += 1
+        raise ServicoSaturado()
+
+def verificar_senha_no_pool(senha, hash_armazenado):
+    """senhas.verificar_senha executada no pool (ver executar_no_pool)."""
+    return executar_no_pool(verificar_senha, senha, hash_armazenado)
+
+def gerar_hash_no_pool(senha):
+    """senhas.gerar_hash executada no pool (ver executar_no_pool)."""
+    return executar_no_pool(gerar_hash, senha)
+
+def _milissegundos(amostras, percentil):
+    if not amostras:
+        return None
+    ordenadas = sorted(amostras)
+    if percentil == 50:
+        return round(statistics.median(ordenadas) * 1000, 1)
+    return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * percentil / 100))] * 1000, 1)
+
+def metricas_pool_senhas():
+    """
+    Situação atual do pool de hash de senhas.
+
+    Returns:
+        dict: workers, fila_maxima, aguardando, executando, concluidas, recusadas,
+              esgotadas e tempos (ms) de hash e de espera na fila (mediana e p95)
+    """
+    with _lock:
+        metricas = dict(_metricas, workers=_pool['workers'], fila_maxima=_pool['fila_maxima'])
+        hash_amostras, espera_amostras = list(_tempos_hash), list(_tempos_espera)
+    metricas.update(
+        hash_ms_mediana=_milissegundos(hash_amostras, 50),
+        hash_ms_p95=_milissegundos(hash_amostras, 95),
+        espera_ms_mediana=_milissegundos(espera_amostras, 50),
+        espera_ms_p95=_milissegundos(espera_amostras, 95),
+    )
+    return metricas
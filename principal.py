@@ -0,0 +1,101 @@
+"""
+Identidade do usuário autenticado, mantida em cache entre as requisições.
+
+O user_loader do Flask-Login roda em toda requisição. Em vez de carregar a
+linha inteira de Usuario, ele devolve um Principal montado a partir de um
+cache em memória com só os campos usados para autorização (CAMPOS_PRINCIPAL).
+A linha completa só é carregada quando a rota lê ou altera algum outro
+atributo (current_user.bio, current_user.two_factor_secret = ...).
+
+Todo commit que altera ou apaga um Usuario invalida a entrada dele no cache.
+O cache é por processo: com vários workers, uma alteração feita em outro
+processo aparece depois de no máximo PRINCIPAL_TTL segundos.
+"""
+import threading
+import time
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from models import Usuario
+from replicas import SessaoRoteada
+from db import db
+
+CAMPOS_PRINCIPAL = ('id', 'tipo', 'nome', 'status', 'conta_revogada', 'status_aprovacao')
+
+_principais = {}
+_lock = threading.Lock()
+
+class Principal(UserMixin):
+    """Usuário autenticado: campos de CAMPOS_PRINCIPAL do cache e o resto da linha sob demanda."""
+
+    def __init__(self, dados):
+        object.__setattr__(self, '_dados', dados)
+        object.__setattr__(self, '_usuario', None)
+
+    @property
+    def usuario(self):
+        """Linha completa do usuário, carregada (uma vez) na sessão da requisição."""
+        if self._usuario is None:
+            object.__setattr__(self, '_usuario', db.session.get(Usuario, self._dados['id']))
+        return self._usuario
+
+    def __getattr__(self, nome):
+        dados = self.__dict__['_dados']
+        if nome in dados:
+            return dados[nome]
+        return getattr(self.usuario, nome)
+
+    def __setattr__(self, nome, valor):
+        # Alterações vão para a linha completa, e o commit invalida o cache
+        setattr(self.usuario, nome, valor)
+        if nome in self._dados:
+            self._dados[nome] = valor
+
+    def __repr__(self):
+        return f"<Principal #{self._dados['id']} {self._dados['tipo']}>"
+
+def carregar_principal(usuario_id):
+    """
+    Obtém o usuário autenticado, do cache ou com uma consulta só dos campos de CAMPOS_PRINCIPAL.
+
+    Args:
+        usuario_id (int): ID do usuário
+
+    Returns:
+        Principal: Identidade do usuário, ou None se ele não existe mais
+    """
+    agora = time.monotonic()
+    with _lock:
+        entrada = _principais.get(usuario_id)
+        if entrada is not None and agora < entrada[1]:
+            return Principal(dict(entrada[0]))
+
+    linha = db.session.query(
+        *[getattr(Usuario, campo) for campo in CAMPOS_PRINCIPAL]
+    ).filter(Usuario.id == usuario_id).first()
+    if linha is None:
+        return None
+
+    dados = dict(zip(CAMPOS_PRINCIPAL, linha))
+    with _lock:
+        _principais[usuario_id] = (dados, agora + current_app.config.get('PRINCIPAL_TTL', 60))
+    return Principal(dict(dados))
+
+def invalidar_principal(usuario_id):
+    """Descarta o usuário do cache (necessário só para alterações feitas fora do ORM, como UPDATE em massa)."""
+    with _lock:
+        _principais.pop(usuario_id, None)
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _anotar_usuarios_alterados(sessao, _contexto):
+    alterados = sessao.info.setdefault('principais_alterados', set())
+    alterados.update(inspect(obj).identity[0] for obj in sessao.dirty | sessao.deleted if isinstance(obj, Usuario))
+
+@event.listens_for(SessaoRoteada, 'after_commit')
+def _invalidar_usuarios_alterados(sessao):
+    for usuario_id in sessao.info.pop('principais_alterados', ()):
+        invalidar_principal(usuario_id)
+
+@event.listens_for(SessaoRoteada, 'after_rollback')
+def _descartar_usuarios_alterados(sessao):
+    sessao.info.pop('principais_alterados', None)
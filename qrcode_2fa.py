@@ -0,0 +1,127 @@
+"""
+Imagens de QR Code da configuração do 2FA, geradas uma vez por segredo.
+
+A imagem fica em um cache em memória (os QR_2FA_CACHE_MAXIMO mais recentes) e
+em disco, em instance/qrcodes_2fa, com nome derivado do hash do segredo (o
+segredo em si nunca aparece no nome). O SVG é gerado sem o Pillow; o PNG
+precisa dele. Quando o 2FA é ativado ou desativado, invalidar_qrcode apaga
+as imagens do segredo, que não são mais necessárias.
+"""
+import glob
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+import qrcode
+import qrcode.image.svg
+from flask import current_app
+
+FORMATOS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+_imagens = OrderedDict()
+_lock = threading.Lock()
+
+def _hash(texto):
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+def chave_qrcode(segredo, uri):
+    """
+    Chave das imagens de um segredo: hash do segredo seguido do hash da URI
+    (que muda, por exemplo, quando o usuário troca de email).
+
+    Args:
+        segredo (str): Segredo TOTP do usuário
+        uri (str): URI otpauth:// codificada no QR Code
+
+    Returns:
+        str: Chave usada no cache, nos nomes dos arquivos e no ETag
+    """
+    return f'{_hash(segredo)[:32]}-{_hash(uri)[:16]}'
+
+def _pasta():
+    return os.path.join(current_app.instance_path, 'qrcodes_2fa')
+
+def _gerar(uri, formato):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(uri)
+    qr.make(fit=True)
+    if formato == 'svg':
+        imagem = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        imagem = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    imagem.save(buffer)
+    return buffer.getvalue()
+
+def _guardar_em_memoria(nome, conteudo):
+    with _lock:
+        _imagens[nome] = conteudo
+        _imagens.move_to_end(nome)
+        while len(_imagens) > current_app.config.get('QR_2FA_CACHE_MAXIMO', 256):
+            _imagens.popitem(last=False)
+
+def _gravar_em_disco(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), mode=0o700, exist_ok=True)
+    temporario = f'{caminho}.{threading.get_ident()}.tmp'
+    # Só o dono lê: a imagem contém o segredo
+    descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+def obter_qrcode(segredo, uri, formato):
+    """
+    Obtém a imagem do QR Code: da memória, do disco ou gerando (e guardando nos dois).
+
+    Args:
+        segredo (str): Segredo TOTP do usuário
+        uri (str): URI otpauth:// a codificar
+        formato (str): 'png' ou 'svg'
+
+    Returns:
+        tuple: (chave da imagem, bytes da imagem)
+    """
+    chave = chave_qrcode(segredo, uri)
+    nome = f'{chave}.{formato}'
+    with _lock:
+        conteudo = _imagens.get(nome)
+        if conteudo is not None:
+            _imagens.move_to_end(nome)
+            return chave, conteudo
+
+    caminho = os.path.join(_pasta(), nome)
+    try:
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+    except FileNotFoundError:
+        conteudo = _gerar(uri, formato)
+        try:
+            _gravar_em_disco(caminho, conteudo)
+        except OSError as e:
+            print(f"Erro ao gravar QR Code do 2FA em disco: {e}")
+
+    _guardar_em_memoria(nome, conteudo)
+    return chave, conteudo
+
+def invalidar_qrcode(segredo):
+    """
+    Apaga da memória e do disco todas as imagens do segredo.
+
+    Args:
+        segredo (str): Segredo TOTP do usuário (None não faz nada)
+    """
+    if not segredo:
+        return
+    prefixo = _hash(segredo)[:32]
+    with _lock:
+        for nome in [n for n in _imagens if n.startswith(prefixo)]:
+            del _imagens[nome]
+    for caminho in glob.glob(os.path.join(_pasta(), f'{prefixo}-*')):
+        try:
+            os.remove(caminho)
+        except OSError as e:
+            print(f"Erro ao apagar QR Code do 2FA: {e}")
@@ -0,0 +1,171 @@
+"""
+Roteamento de leituras para réplicas do banco de dados.
+
+As réplicas são binds do Flask-SQLAlchemy com prefixo 'replica_' (montados por
+binds_das_replicas a partir de DATABASE_REPLICA_URLS). Só as rotas marcadas com
+@somente_leitura leem delas; todo o resto, e qualquer flush, usa o primário.
+
+Depois de uma requisição que gravou algo, o horário da escrita fica na sessão
+do usuário, e uma réplica só volta a ser usada por ele quando seu atraso
+(medido a cada REPLICA_INTERVALO_VERIFICACAO segundos) indicar que ela já
+recebeu essa escrita. Réplicas fora do ar ou com atraso acima de
+REPLICA_ATRASO_MAXIMO são ignoradas, e sem réplica elegível a leitura vai
+para o primário.
+"""
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+PREFIXO_BIND = 'replica_'
+
+_SQL_ATRASO_POSTGRESQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_atrasos = {}
+_lock = threading.Lock()
+
+class SessaoRoteada(Session):
+    """Sessão que envia as leituras das rotas @somente_leitura para uma réplica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _rota_somente_leitura():
+            replica = escolher_replica(self._db)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _marcar_escrita(_sessao, _contexto):
+    if has_request_context():
+        g.houve_escrita = True
+
+def binds_das_replicas(urls):
+    """
+    Monta o SQLALCHEMY_BINDS das réplicas.
+
+    Args:
+        urls (str): URLs das réplicas separadas por vírgula (pode ser vazio)
+
+    Returns:
+        dict: {'replica_0': url, 'replica_1': url, ...}
+    """
+    binds = {}
+    for url in filter(None, (u.strip() for u in (urls or '').split(','))):
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        binds[f'{PREFIXO_BIND}{len(binds)}'] = url
+    return binds
+
+def iniciar_replicas(app):
+    """
+    Registra o hook que guarda na sessão do usuário o horário da última escrita.
+
+    Args:
+        app: Aplicação Flask
+
+    Returns:
+        bool: True se há réplicas configuradas
+    """
+    if not any(chave.startswith(PREFIXO_BIND) for chave in app.config.get('SQLALCHEMY_BINDS') or {}):
+        return False
+
+    @app.after_request
+    def _registrar_escrita(resposta):
+        if g.get('houve_escrita'):
+            session['ultima_escrita'] = time.time()
+        return resposta
+
+    return True
+
+def somente_leitura(f):
+    """Marca uma rota como somente leitura: em GET/HEAD, suas consultas podem ir para uma réplica."""
+    @wraps(f)
+    def decorada(*args, **kwargs):
+        g.rota_somente_leitura = request.method in ('GET', 'HEAD')
+        return f(*args, **kwargs)
+    return decorada
+
+def _rota_somente_leitura():
+    return has_request_context() and g.get('rota_somente_leitura', False)
+
+def escolher_replica(db):
+    """
+    Escolhe a réplica usada pela requisição atual. A escolha vale para a
+    requisição inteira, para que todas as leituras vejam o mesmo estado.
+
+    Args:
+        db: Extensão SQLAlchemy
+
+    Returns:
+        Engine: Engine da réplica, ou None se a leitura deve ir para o primário
+    """
+    if '_replica' in g:
+        return g._replica
+
+    config = current_app.config
+    atraso_maximo = config.get('REPLICA_ATRASO_MAXIMO', 10)
+    margem = config.get('REPLICA_MARGEM_ESCRITA', 2)
+    ultima_escrita = session.get('ultima_escrita')
+    agora = time.time()
+
+    candidatas = []
+    for chave, engine in db.engines.items():
+        if not chave or not chave.startswith(PREFIXO_BIND):
+            continue
+        atraso = atraso_replica(chave, engine)
+        if atraso is None or atraso > atraso_maximo:
+            continue
+        # A réplica ainda pode não ter recebido a última escrita deste usuário
+        if ultima_escrita is not None and agora - ultima_escrita < atraso + margem:
+            continue
+        candidatas.append(engine)
+
+    g._replica = random.choice(candidatas) if candidatas else None
+    return g._replica
+
+def atraso_replica(chave, engine):
+    """
+    Atraso de replicação da réplica, em segundos, medido no máximo a cada
+    REPLICA_INTERVALO_VERIFICACAO segundos.
+
+    Args:
+        chave (str): Nome do bind da réplica
+        engine: Engine da réplica
+
+    Returns:
+        float: Atraso em segundos, ou None se a réplica está indisponível
+    """
+    intervalo = current_app.config.get('REPLICA_INTERVALO_VERIFICACAO', 5)
+    agora = time.monotonic()
+    with _lock:
+        medicao = _atrasos.get(chave)
+        if medicao is not None and agora - medicao[1] < intervalo:
+            return medicao[0]
+
+    try:
+        atraso = _medir_atraso(engine)
+    except Exception as e:
+        print(f"Réplica {chave} indisponível: {e}")
+        atraso = None
+
+    with _lock:
+        _atrasos[chave] = (atraso, agora)
+    return atraso
+
+def _medir_atraso(engine):
+    with engine.connect() as conexao:
+        if engine.dialect.name != 'postgresql':
+            # Sem como medir o atraso (ex: cópia SQLite em desenvolvimento); basta estar acessível
+            conexao.execute(text('SELECT 1'))
+            return 0.0
+        atraso = conexao.execute(text(_SQL_ATRASO_POSTGRESQL)).scalar()
+    return None if atraso is None else float(atraso)
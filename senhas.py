@@ -0,0 +1,159 @@
+"""
+Hash de senhas com sal por usuário e custo configurável.
+
+O hash guardado em Usuario.senha diz como foi gerado:
+
+    scrypt$<n>$<r>$<p>$<sal>$<hash>
+    pbkdf2_sha256$<iterações>$<sal>$<hash>
+
+(sal e hash em base64). Hashes sem prefixo são o SHA-256 sem sal das versões
+anteriores: continuam aceitos e, no login bem-sucedido, precisa_rehash indica
+que devem ser trocados pelo formato atual. O mesmo vale para hashes gerados
+com um algoritmo ou custo diferente do configurado (SENHA_ALGORITMO,
+SENHA_SCRYPT_N/R/P, SENHA_PBKDF2_ITERACOES).
+"""
+import base64
+import hashlib
+import hmac
+import os
+from flask import current_app, has_app_context
+
+PADRAO = {
+    'SENHA_ALGORITMO': 'scrypt',
+    'SENHA_SCRYPT_N': 2 ** 14,
+    'SENHA_SCRYPT_R': 8,
+    'SENHA_SCRYPT_P': 1,
+    'SENHA_PBKDF2_ITERACOES': 600000,
+}
+
+_TAMANHO_SAL = 16
+_TAMANHO_HASH = 32
+
+def _b64(dados):
+    return base64.b64encode(dados).decode('ascii')
+
+def _de_b64(texto):
+    return base64.b64decode(texto.encode('ascii'))
+
+def _scrypt(senha, sal, n, r, p):
+    # Memória usada pelo scrypt: 128 * r * n bytes; o limite padrão do OpenSSL é de 32 MiB
+    return hashlib.scrypt(senha.encode('utf-8'), salt=sal, n=n, r=r, p=p,
+                          maxmem=256 * r * n + 1024 * 1024, dklen=_TAMANHO_HASH)
+
+def _pbkdf2(senha, sal, iteracoes):
+    return hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), sal, iteracoes, dklen=_TAMANHO_HASH)
+
+# Para cada algoritmo: parâmetros de custo na configuração e função de derivação
+ALGORITMOS = {
+    'scrypt': {
+        'parametros': ('SENHA_SCRYPT_N', 'SENHA_SCRYPT_R', 'SENHA_SCRYPT_P'),
+        'derivar': _scrypt,
+    },
+    'pbkdf2_sha256': {
+        'parametros': ('SENHA_PBKDF2_ITERACOES',),
+        'derivar': _pbkdf2,
+    },
+}
+
+def _configuracao(config=None):
+    if config is None:
+        config = current_app.config if has_app_context() else {}
+    return {chave: config.get(chave, padrao) for chave, padrao in PADRAO.items()}
+
+def gerar_hash(senha, config=None):
+    """
+    Gera o hash de uma senha com sal novo, no algoritmo e custo configurados.
+
+    Args:
+        senha (str): Senha em texto
+        config (dict, optional): Configuração com as chaves de PADRAO (padrão: a da aplicação)
+
+    Returns:
+        str: Hash no formato <algoritmo>$<parâmetros>$<sal>$<hash>
+    """
+    config = _configuracao(config)
+    algoritmo = config['SENHA_ALGORITMO']
+    if algoritmo not in ALGORITMOS:
+        raise ValueError(f"Algoritmo de senha desconhecido: {algoritmo}")
+
+    parametros = [int(config[chave]) for chave in ALGORITMOS[algoritmo]['parametros']]
+    sal = os.urandom(_TAMANHO_SAL)
+    derivada = ALGORITMOS[algoritmo]['derivar'](senha, sal, *parametros)
+    return '$'.join([algoritmo, *map(str, parametros), _b64(sal), _b64(derivada)])
+
+def _decompor(hash_armazenado):
+    partes = (hash_armazenado or '').split('$')
+    algoritmo = partes[0]
+    if algoritmo not in ALGORITMOS:
+        return None
+    quantidade = len(ALGORITMOS[algoritmo]['parametros'])
+    if len(partes) != quantidade + 3:
+        return None
+    return algoritmo, [int(p) for p in partes[1:1 + quantidade]], _de_b64(partes[-2]), _de_b64(partes[-1])
+
+def _legado(hash_armazenado):
+    return len(hash_armazenado or '') == 64 and '$' not in hash_armazenado
+
+# Usado quando o usuário não existe, para que a resposta leve o mesmo tempo
+_HASH_FICTICIO = None
+
+def verificar_senha(senha, hash_armazenado):
+    """
+    Confere uma senha com o hash guardado (formato atual ou SHA-256 legado).
+
+    Com hash_armazenado None (usuário inexistente), calcula um hash fictício
+    mesmo assim, para que o tempo de resposta não revele quais emails existem.
+
+    Args:
+        senha (str): Senha informada
+        hash_armazenado (str): Valor de Usuario.senha, ou None
+
+    Returns:
+        bool: True se a senha confere
+    """
+    global _HASH_FICTICIO
+    if hash_armazenado is None:
+        if _HASH_FICTICIO is None:
+            _HASH_FICTICIO = gerar_hash('senha-ficticia')
+        verificar_senha(senha, _HASH_FICTICIO)
+        return False
+
+    if _legado(hash_armazenado):
+        calculado = hashlib.sha256(senha.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(calculado, hash_armazenado.lower())
+
+    try:
+        decomposto = _decompor(hash_armazenado)
+    except (ValueError, TypeError):
+        decomposto = None
+    if decomposto is None:
+        print(f"Hash de senha em formato desconhecido: {hash_armazenado[:20]}...")
+        return False
+
+    algoritmo, parametros, sal, esperado = decomposto
+    calculado = ALGORITMOS[algoritmo]['derivar'](senha, sal, *parametros)
+    return hmac.compare_digest(calculado, esperado)
+
+def precisa_rehash(hash_armazenado, config=None):
+    """
+    Indica se o hash deve ser regerado: legado, de outro algoritmo ou de outro custo.
+
+    Args:
+        hash_armazenado (str): Valor de Usuario.senha
+        config (dict, optional): Configuração com as chaves de PADRAO (padrão: a da aplicação)
+
+    Returns:
+        bool: True se o hash não está no algoritmo e custo configurados
+    """
+    config = _configuracao(config)
+    try:
+        decomposto = _decompor(hash_armazenado)
+    except (ValueError, TypeError):
+        return True
+    if decomposto is None:
+        return True
+
+    algoritmo, parametros, _, _ = decomposto
+    if algoritmo != config['SENHA_ALGORITMO']:
+        return True
+    return parametros != [int(config[chave]) for chave in ALGORITMOS[algoritmo]['parametros']]
@@ -0,0 +1,176 @@
+"""
+Verificação dos códigos TOTP do 2FA, com proteção contra reuso.
+
+Um código TOTP vale por um passo de 30 segundos (mais TOTP_JANELA passos de
+tolerância para relógios adiantados ou atrasados). Sem registro, o mesmo
+código poderia ser usado de novo enquanto vale. Aqui, para cada usuário, fica
+guardado só o último passo aceito: um código do mesmo passo ou de um passo
+anterior é recusado. O registro expira quando esse passo sai da janela, então
+a memória é de uma entrada por usuário que usou o 2FA nos últimos minutos.
+
+Os objetos pyotp.TOTP também ficam em cache por usuário (os TOTP_CACHE_MAXIMO
+mais recentes), recriados se o segredo mudar.
+
+Os passos usados ficam na memória do processo. Com vários workers na mesma
+máquina, TOTP_PASSOS_ARQUIVO aponta para um arquivo SQLite compartilhado
+entre eles (como LIMITE_TAXA_ARQUIVO em limite_taxa.py).
+"""
+import hmac
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pyotp
+from flask import current_app
+
+_DDL_PASSOS = """
+    CREATE TABLE IF NOT EXISTS passos_totp (
+        usuario_id INTEGER PRIMARY KEY,
+        passo INTEGER NOT NULL,
+        expira_em REAL NOT NULL
+    )
+"""
+
+_LIMPEZA_A_CADA = 1000
+
+class PassosMemoria:
+    """Último passo aceito de cada usuário, em um dicionário do processo."""
+
+    def __init__(self):
+        self._passos = {}
+        self._lock = threading.Lock()
+        self._chamadas = 0
+
+    def registrar(self, usuario_id, passo, expira_em, agora):
+        with self._lock:
+            self._chamadas += 1
+            if self._chamadas % _LIMPEZA_A_CADA == 0:
+                self._passos = {u: v for u, v in self._passos.items() if v[1] > agora}
+
+            ultimo, expira_ultimo = self._passos.get(usuario_id, (None, 0))
+            if ultimo is not None and expira_ultimo > agora and passo <= ultimo:
+                return False
+            self._passos[usuario_id] = (passo, expira_em)
+            return True
+
+    def esquecer(self, usuario_id):
+        with self._lock:
+            self._passos.pop(usuario_id, None)
+
+class PassosSqlite:
+    """Último passo aceito de cada usuário, em um arquivo SQLite compartilhado pelos workers."""
+
+    def __init__(self, caminho):
+        self._caminho = caminho
+        self._chamadas = 0
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(_DDL_PASSOS)
+
+    def _conectar(self):
+        return sqlite3.connect(self._caminho, timeout=5, isolation_level=None)
+
+    def registrar(self, usuario_id, passo, expira_em, agora):
+        conexao = self._conectar()
+        try:
+            self._chamadas += 1
+            if self._chamadas % _LIMPEZA_A_CADA == 0:
+                conexao.execute("DELETE FROM passos_totp WHERE expira_em <= ?", (agora,))
+            # Um único comando: só grava (e só aceita) se o passo for novo para o usuário
+            cursor = conexao.execute("""
+                INSERT INTO passos_totp (usuario_id, passo, expira_em) VALUES (?, ?, ?)
+                ON CONFLICT (usuario_id) DO UPDATE SET passo = excluded.passo, expira_em = excluded.expira_em
+                WHERE passos_totp.passo < excluded.passo OR passos_totp.expira_em <= ?
+            """, (usuario_id, passo, expira_em, agora))
+            return cursor.rowcount == 1
+        finally:
+            conexao.close()
+
+    def esquecer(self, usuario_id):
+        conexao = self._conectar()
+        try:
+            conexao.execute("DELETE FROM passos_totp WHERE usuario_id = ?", (usuario_id,))
+        finally:
+            conexao.close()
+
+_armazenamento = {'passos': None}
+_totps = OrderedDict()
+_lock = threading.Lock()
+
+def _obter_passos():
+    with _lock:
+        if _armazenamento['passos'] is None:
+            arquivo = current_app.config.get('TOTP_PASSOS_ARQUIVO')
+            _armazenamento['passos'] = PassosSqlite(arquivo) if arquivo else PassosMemoria()
+        return _armazenamento['passos']
+
+def _obter_totp(usuario_id, segredo):
+    with _lock:
+        guardado = _totps.get(usuario_id)
+        if guardado is not None and hmac.compare_digest(guardado[0], segredo):
+            _totps.move_to_end(usuario_id)
+            return guardado[1]
+
+        totp = pyotp.TOTP(segredo)
+        _totps[usuario_id] = (segredo, totp)
+        _totps.move_to_end(usuario_id)
+        while len(_totps) > current_app.config.get('TOTP_CACHE_MAXIMO', 1024):
+            _totps.popitem(last=False)
+        return totp
+
+def verificar_codigo_totp(usuario_id, segredo, codigo):
+    """
+    Confere um código TOTP e, se válido, marca o passo dele como usado.
+
+    Args:
+        usuario_id (int): ID do usuário
+        segredo (str): Segredo TOTP do usuário
+        codigo (str): Código informado (espaços são ignorados)
+
+    Returns:
+        bool: True se o código é válido e ainda não foi usado
+    """
+    if not segredo or not codigo:
+        return False
+    codigo = str(codigo).replace(' ', '')
+    if not codigo.isdigit():
+        return False
+
+    totp = _obter_totp(usuario_id, segredo)
+    if len(codigo) != totp.digits:
+        return False
+
+    janela = int(current_app.config.get('TOTP_JANELA', 1))
+    agora = time.time()
+    passo_atual = int(agora // totp.interval)
+
+    # Todos os passos da janela são calculados, para o tempo não revelar qual deles bateu
+    aceito = None
+    for passo in range(passo_atual - janela, passo_atual + janela + 1):
+        if hmac.compare_digest(totp.generate_otp(passo), codigo) and aceito is None:
+            aceito = passo
+    if aceito is None:
+        return False
+
+    # Depois disso o passo já saiu da janela de qualquer verificação
+    expira_em = (aceito + janela + 1) * totp.interval
+    try:
+        return _obter_passos().registrar(usuario_id, aceito, expira_em, agora)
+    except sqlite3.Error as e:
+        # Sem o arquivo compartilhado, o código é aceito: o registro não pode derrubar o login
+        print(f"Erro ao registrar passo TOTP usado: {e}")
+        return True
+
+def esquecer_totp(usuario_id):
+    """
+    Descarta o TOTP em cache e o passo usado do usuário (ao desativar o 2FA).
+
+    Args:
+        usuario_id (int): ID do usuário
+    """
+    with _lock:
+        _totps.pop(usuario_id, None)
+    try:
+        _obter_passos().esquecer(usuario_id)
+    except sqlite3.Error as e:
+        print(f"Erro ao descartar passo TOTP usado: {e}")
@@ -0,0 +1,68 @@
+"""
+Verificação da fila de emails com mensagens inválidas.
+
+Em um SQLite temporário e sem servidor SMTP (MAIL_SUPPRESS_SEND), enfileira
+um email com quebra de linha no assunto (cabeçalho inválido) junto com um
+email válido no mesmo lote e confere que o inválido vai para as falhas sem
+travar o lote, e que o válido é enviado. Falha (código de saída 1) se não.
+
+Uso: python verificar_fila_emails.py
+"""
+import os
+import sys
+import tempfile
+
+def verificar():
+    """
+    Roda o cenário e confere o status final de cada email.
+
+    Returns:
+        list: Descrições das verificações que falharam
+    """
+    pasta = tempfile.mkdtemp(prefix='verificar_fila_emails_')
+    # A aplicação lê DATABASE_URL e EMAIL_* ao ser importada
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(pasta, 'fila.db')}"
+    os.environ['SQLITE_MANUTENCAO_INTERVALO'] = '0'
+    os.environ['EMAIL_INTERVALO'] = '0'
+    os.environ['EMAIL_TENTATIVAS_MAXIMAS'] = '1'
+    os.environ['MAIL_SUPPRESS_SEND'] = '1'
+
+    from main import app
+    from db import db
+    from models import EmailFila
+    from fila_emails import enfileirar_email, processar_fila
+
+    falhas = []
+    with app.app_context():
+        db.create_all()
+        invalido = enfileirar_email('invalido@exemplo.com', 'Assunto\nBcc: outro@exemplo.com', '<p>x</p>')
+        valido = enfileirar_email('valido@exemplo.com', 'Assunto', '<p>x</p>')
+        db.session.commit()
+
+        try:
+            reservados, enviados, erros = processar_fila()
+        except Exception as e:
+            return [f'processar_fila levantou {type(e).__name__}: {e}']
+
+        invalido, valido = db.session.get(EmailFila, invalido.id), db.session.get(EmailFila, valido.id)
+        if (reservados, enviados, erros) != (2, 1, 1):
+            falhas.append(f'lote (reservados, enviados, falhas) = {(reservados, enviados, erros)}, esperado (2, 1, 1)')
+        if invalido.status != 'falhou' or invalido.reservado_por is not None:
+            falhas.append(f"email com cabeçalho inválido ficou '{invalido.status}'")
+        if valido.status != 'enviado':
+            falhas.append(f"email válido do mesmo lote ficou '{valido.status}'")
+    return falhas
+
+if __name__ == '__main__':
+    print("\n" + "="*70)
+    print("VERIFICANDO A FILA DE EMAILS COM MENSAGEM INVÁLIDA")
+    print("="*70)
+
+    falhas = verificar()
+    for falha in falhas:
+        print(f"❌ {falha}")
+    if not falhas:
+        print("✅ Email inválido foi para as falhas e o válido do mesmo lote foi enviado")
+    print("="*70 + "\n")
+
+    sys.exit(1 if falhas else 0)
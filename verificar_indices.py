@@ -0,0 +1,155 @@
+"""
+Verificação dos planos de consulta das rotas mais acessadas.
+
+Cria o esquema dos modelos em um SQLite em memória, roda EXPLAIN QUERY PLAN
+para cada consulta quente e falha (código de saída 1) se alguma delas fizer
+varredura completa de tabela em vez de usar um índice.
+
+Uso: python verificar_indices.py
+"""
+import re
+import sys
+from sqlalchemy import create_engine, select, func, text
+from db import db
+from models import (Usuario, Campanha, VoluntarioCampanha, SolicitacaoDoacao, SolicitacaoRecebimento,
+                    Delegacao, DenunciaVoluntario, LogAcaoModerador, Advertencia, ResumoArquivoLogModeracao)
+
+_VARREDURA = re.compile(r'^SCAN (\w+)$')
+
+def consultas_quentes():
+    """
+    Lista as consultas das rotas mais acessadas, na forma usada pelo main.py.
+
+    Returns:
+        list: Lista de tuplas (descrição, statement)
+    """
+    contagem = select(
+        VoluntarioCampanha.campanha_id,
+        func.count(VoluntarioCampanha.id).label('total')
+    ).group_by(VoluntarioCampanha.campanha_id)
+    entregues = select(func.sum(SolicitacaoRecebimento.cestas_entregues)).join(
+        Delegacao, Delegacao.solicitacao_recebimento_id == SolicitacaoRecebimento.id
+    ).where(Delegacao.instituicao_id == 1, SolicitacaoRecebimento.status == 'entregue')
+
+    return [
+        ('campanhas: recentes',
+         select(Campanha).where(Campanha.status == 'ativa')
+         .order_by(Campanha.data_criacao.desc(), Campanha.id.desc()).limit(13)),
+        ('campanhas: alfabética',
+         select(Campanha).where(Campanha.status == 'ativa')
+         .order_by(Campanha.titulo.asc(), Campanha.id.asc()).limit(13)),
+        ('campanhas: próximas da meta',
+         select(Campanha).where(Campanha.status == 'ativa')
+         .order_by(Campanha.progresso_meta.desc(), Campanha.id.desc()).limit(13)),
+        ('campanhas: contagem de voluntários', contagem),
+        ('campanhas: localizações (facetas)',
+         select(Campanha.localizacao, func.count(Campanha.id)).where(Campanha.status == 'ativa')
+         .group_by(Campanha.localizacao)),
+        ('campanhas: pendentes (moderação)',
+         select(func.count(Campanha.id)).where(Campanha.status == 'pendente')),
+        ('solicitarcampanha: limite por usuário',
+         select(func.count(Campanha.id)).where(Campanha.solicitante_id == 1,
+                                               Campanha.status.in_(['ativa', 'pendente']))),
+        ('minhas_solicitacoes: campanhas',
+         select(Campanha).where(Campanha.solicitante_id == 1).order_by(Campanha.data_criacao.desc())),
+        ('minhas_solicitacoes: doações',
+         select(SolicitacaoDoacao).where(SolicitacaoDoacao.usuario_id == 1)
+         .order_by(SolicitacaoDoacao.data_criacao.desc())),
+        ('minhas_solicitacoes: recebimentos',
+         select(SolicitacaoRecebimento).where(SolicitacaoRecebimento.usuario_id == 1)
+         .order_by(SolicitacaoRecebimento.data_criacao.desc())),
+        ('formulariodoar: recebimentos aprovados',
+         select(SolicitacaoRecebimento).where(SolicitacaoRecebimento.status == 'aprovada')
+         .order_by(SolicitacaoRecebimento.data_criacao.desc())),
+        ('moderacao: recebimentos pendentes',
+         select(SolicitacaoRecebimento).where(SolicitacaoRecebimento.status == 'pendente')
+         .order_by(SolicitacaoRecebimento.data_criacao.desc(), SolicitacaoRecebimento.id.desc()).limit(21)),
+        ('moderacao: instituições',
+         select(Usuario).where(Usuario.tipo == 'instituicao', Usuario.status_aprovacao == 'aprovada')),
+        ('moderacao: instituições pendentes',
+         select(Usuario).where(Usuario.tipo == 'instituicao', Usuario.status_aprovacao == 'pendente')
+         .order_by(Usuario.data_criacao.desc(), Usuario.id.desc()).limit(21)),
+        ('moderacao: denúncias pendentes',
+         select(DenunciaVoluntario).where(DenunciaVoluntario.status == 'pendente')
+         .order_by(DenunciaVoluntario.data_denuncia.desc(), DenunciaVoluntario.id.desc()).limit(21)),
+        ('moderacao: logs recentes',
+         select(LogAcaoModerador).order_by(LogAcaoModerador.data_acao.desc(), LogAcaoModerador.id.desc()).limit(21)),
+        ('log_utils: logs por moderador',
+         select(LogAcaoModerador).where(LogAcaoModerador.moderador_id == 1)
+         .order_by(LogAcaoModerador.data_acao.desc()).limit(50)),
+        ('log_utils: logs por tipo',
+         select(LogAcaoModerador).where(LogAcaoModerador.tipo_item == 'campanha')
+         .order_by(LogAcaoModerador.data_acao.desc()).limit(50)),
+        ('log_utils: estatísticas do moderador',
+         select(LogAcaoModerador.categoria, func.count(LogAcaoModerador.id))
+         .where(LogAcaoModerador.moderador_id == 1).group_by(LogAcaoModerador.categoria)),
+        ('log_utils: estatísticas de todos os moderadores',
+         select(LogAcaoModerador.moderador_id, Usuario.nome, LogAcaoModerador.categoria, func.count(LogAcaoModerador.id))
+         .join(Usuario, Usuario.id == LogAcaoModerador.moderador_id)
+         .group_by(LogAcaoModerador.moderador_id, Usuario.nome, LogAcaoModerador.categoria)),
+        ('arquivo_logs: meses arquivados do moderador',
+         select(ResumoArquivoLogModeracao.periodo).where(ResumoArquivoLogModeracao.moderador_id == 1)
+         .distinct().order_by(ResumoArquivoLogModeracao.periodo.desc())),
+        ('arquivo_logs: meses arquivados por tipo',
+         select(ResumoArquivoLogModeracao.periodo).where(ResumoArquivoLogModeracao.tipo_item == 'campanha')
+         .distinct().order_by(ResumoArquivoLogModeracao.periodo.desc())),
+        ('instituicao: delegações',
+         select(Delegacao).where(Delegacao.instituicao_id == 1, Delegacao.status == 'pendente')),
+        ('instituicao: campanhas delegadas',
+         select(Campanha).where(Campanha.instituicao_id == 1)),
+        ('instituicao: totais entregues', entregues),
+        ('delegar: delegação existente',
+         select(Delegacao).where(Delegacao.solicitacao_doacao_id == 1)),
+        ('voluntariar: inscrição existente',
+         select(VoluntarioCampanha).where(VoluntarioCampanha.usuario_id == 1,
+                                          VoluntarioCampanha.campanha_id == 1)),
+        ('perfil: advertência não vista',
+         select(Advertencia).where(Advertencia.usuario_id == 1, Advertencia.vista == False)
+         .order_by(Advertencia.data_acao.desc()).limit(1)),
+        ('registrar: CPF existente',
+         select(Usuario).where(Usuario.cpf == '11111111111')),
+        ('login: usuário por email',
+         select(Usuario).where(Usuario.email == 'exemplo@email.com')),
+    ]
+
+def verificar_planos(engine):
+    """
+    Roda EXPLAIN QUERY PLAN para cada consulta quente.
+
+    Args:
+        engine: Engine SQLite com o esquema dos modelos criado
+
+    Returns:
+        list: Lista de tuplas (descrição, tabela varrida, plano completo) das consultas sem índice
+    """
+    falhas = []
+    with engine.connect() as conexao:
+        for descricao, statement in consultas_quentes():
+            sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+            plano = [linha[3] for linha in conexao.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            for detalhe in plano:
+                varredura = _VARREDURA.match(detalhe)
+                if varredura:
+                    falhas.append((descricao, varredura.group(1), plano))
+    return falhas
+
+if __name__ == '__main__':
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+
+    print("\n" + "="*70)
+    print("VERIFICANDO PLANOS DE CONSULTA DAS ROTAS QUENTES")
+    print("="*70)
+
+    falhas = verificar_planos(engine)
+    total = len(consultas_quentes())
+
+    for descricao, tabela, plano in falhas:
+        print(f"❌ {descricao}: varredura completa em '{tabela}'")
+        for detalhe in plano:
+            print(f"     {detalhe}")
+
+    print(f"\n✅ {total - len({f[0] for f in falhas})}/{total} consultas usando índice")
+    print("="*70 + "\n")
+
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,84 @@
+"""
+Verificação do assunto das notificações com títulos de campanha longos.
+
+Em um SQLite temporário e sem servidor SMTP (MAIL_SUPPRESS_SEND), suspende
+uma campanha com título de 200 caracteres (o máximo da coluna) e outra com
+quebras de linha no título, e confere que o assunto enfileirado cabe na
+coluna assunto da fila de emails, não tem quebras de linha e mantém o status
+no final. O SQLite não limita o tamanho de VARCHAR, por isso o tamanho é
+conferido aqui: no PostgreSQL o INSERT falharia e desfaria a suspensão.
+Falha (código de saída 1) se não.
+
+Uso: python verificar_notificacoes.py
+"""
+import os
+import sys
+import tempfile
+
+def verificar():
+    """
+    Roda o cenário e confere o assunto de cada email enfileirado.
+
+    Returns:
+        list: Descrições das verificações que falharam
+    """
+    pasta = tempfile.mkdtemp(prefix='verificar_notificacoes_')
+    # A aplicação lê DATABASE_URL e EMAIL_* ao ser importada
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(pasta, 'notificacoes.db')}"
+    os.environ['SQLITE_MANUTENCAO_INTERVALO'] = '0'
+    os.environ['EMAIL_INTERVALO'] = '0'
+    os.environ['MAIL_SUPPRESS_SEND'] = '1'
+
+    from main import app
+    from db import db
+    from models import Campanha, EmailFila, Usuario, VoluntarioCampanha
+    from notificacoes import notificar_status_campanha
+
+    maximo = EmailFila.__table__.c.assunto.type.length
+    titulos = {
+        'título de 200 caracteres': 'Campanha de arrecadação ' + 'x' * (maximo - 24),
+        'título com quebras de linha': 'Campanha\r\nBcc: outro@exemplo.com',
+    }
+
+    falhas = []
+    with app.app_context():
+        db.create_all()
+        voluntario = Usuario(nome='Voluntário', email='voluntario@exemplo.com', senha='x', tipo='usuario')
+        db.session.add(voluntario)
+        db.session.flush()
+
+        with app.test_request_context():
+            for descricao, titulo in titulos.items():
+                campanha = Campanha(titulo=titulo, descricao='Descrição', localizacao='Recife', status='suspensa')
+                db.session.add(campanha)
+                db.session.flush()
+                db.session.add(VoluntarioCampanha(usuario_id=voluntario.id, campanha_id=campanha.id))
+                db.session.flush()
+
+                if notificar_status_campanha(campanha) != 1:
+                    falhas.append(f'{descricao}: nenhum email enfileirado')
+                    continue
+                db.session.commit()
+
+                assunto = EmailFila.query.order_by(EmailFila.id.desc()).first().assunto
+                if len(assunto) > maximo:
+                    falhas.append(f'{descricao}: assunto com {len(assunto)} caracteres, máximo {maximo}')
+                if '\r' in assunto or '\n' in assunto:
+                    falhas.append(f'{descricao}: assunto com quebra de linha')
+                if not assunto.endswith('foi suspensa'):
+                    falhas.append(f"{descricao}: assunto perdeu o status ('{assunto[-30:]}')")
+    return falhas
+
+if __name__ == '__main__':
+    print("\n" + "="*70)
+    print("VERIFICANDO O ASSUNTO DAS NOTIFICAÇÕES")
+    print("="*70)
+
+    falhas = verificar()
+    for falha in falhas:
+        print(f"❌ {falha}")
+    if not falhas:
+        print("✅ Assuntos cabem na fila de emails, sem quebras de linha e com o status")
+    print("="*70 + "\n")
+
+    sys.exit(1 if falhas else 0)